@@ -0,0 +1,69 @@
+import random
+import time
+
+import numpy as np
+
+
+class HumanPacing:
+    """Sleeps a random, human-looking delay after every action."""
+
+    def __init__(self, base=0.5, jitter=1.0):
+        self.base = base
+        self.jitter = jitter
+
+    def after_action(self):
+        time.sleep(self.base + random.random() * self.jitter)
+
+
+class NoPacing:
+    """Acts as fast as the game can take it."""
+
+    def after_action(self):
+        pass
+
+
+class ActionScheduler:
+    """
+    Executes bursts of known-safe clicks and flags, then waits only until the
+    screen reflects them instead of sleeping a fixed time.
+
+    After a burst the scheduler polls the centre pixel of every touched cell
+    and returns once each of them has differed from its colour before the
+    burst (every flag is drawn and every cell revealed), or when
+    settle_timeout runs out.
+    """
+
+    def __init__(self, bot, pacing=None, settle_timeout=2.0, poll_interval=0.01):
+        self.bot = bot
+        self.pacing = pacing if pacing is not None else NoPacing()
+        self.settle_timeout = settle_timeout
+        self.poll_interval = poll_interval
+
+    def run_burst(self, clicks, flags=()):
+        """Flag every mine, click every safe cell, then wait for the board to change. Cells are (row, col)."""
+        cells = list(flags) + list(clicks)
+        if not cells:
+            return False
+        board_processor = self.bot.board_processor
+        before = board_processor.region_pixels(cells)
+
+        for x, y in flags:
+            self.bot.click_cell(y, x, flag=True)
+            self.bot.analyzer.mark_mine(x, y)
+            self.pacing.after_action()
+        for x, y in clicks:
+            self.bot.click_cell(y, x)
+            self.pacing.after_action()
+
+        return self.wait_for_change(cells, before)
+
+    def wait_for_change(self, cells, before):
+        """Whether every cell changed before the timeout. A half-drawn burst keeps waiting."""
+        deadline = time.perf_counter() + self.settle_timeout
+        changed = np.zeros(before.shape, dtype=bool)
+        while time.perf_counter() < deadline:
+            changed |= self.bot.board_processor.region_pixels(cells) != before
+            if changed.all():
+                return True
+            time.sleep(self.poll_interval)
+        return False
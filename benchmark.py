@@ -0,0 +1,102 @@
+"""
+Plays seeded games against the simulator and reports solver quality and speed as JSON.
+
+    python benchmark.py --games 200 --workers 8 --output results.json
+"""
+import argparse
+import json
+import multiprocessing
+import time
+
+from minesweeper_analyzer import ComponentCache
+from minesweeper_simulator import STAGES, MinesweeperGame, SimulatedBot
+
+
+# name -> (rows, cols, mines)
+CONFIGURATIONS = {
+    'beginner': (9, 9, 10),
+    'intermediate': (16, 16, 40),
+    'expert': (16, 30, 99),
+    'large': (40, 60, 480),
+}
+
+# Component solutions are shared by every game a worker process plays
+COMPONENT_CACHE = ComponentCache()
+
+
+def play_game(task):
+    """Play one seeded game. Runs in a worker process."""
+    rows, cols, mines, seed, mine_count_known = task
+    game = MinesweeperGame(rows, cols, mines, seed=seed)
+    start = time.perf_counter()
+    result = SimulatedBot(game, component_cache=COMPONENT_CACHE, mine_count_known=mine_count_known).play()
+    result['duration'] = time.perf_counter() - start
+    return result
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def summarize(results, elapsed):
+    games = len(results)
+    summary = {
+        'games': games,
+        'win_rate': sum(result['won'] for result in results) / games,
+        'guesses_per_game': sum(result['guesses'] for result in results) / games,
+        'chords_per_game': sum(result['chords'] for result in results) / games,
+        'moves_per_game': sum(result['moves'] for result in results) / games,
+        'games_per_second': games / elapsed,
+        'stages': {},
+    }
+    hits = sum(result['cache_hits'] for result in results)
+    lookups = hits + sum(result['cache_misses'] for result in results)
+    summary['component_cache'] = {'lookups': lookups, 'hit_rate': hits / lookups if lookups else 0.0}
+    for stage in STAGES:
+        times = [t for result in results for t in result['stage_times'][stage]]
+        summary['stages'][stage] = {
+            'calls': len(times),
+            'mean_ms': 1000 * sum(times) / len(times) if times else 0.0,
+            'p99_ms': 1000 * percentile(times, 0.99),
+        }
+    return summary
+
+
+def run_benchmark(configurations, games, workers, seed=0, mine_count_known=True):
+    report = {'games_per_configuration': games, 'workers': workers, 'seed': seed,
+              'mine_count_known': mine_count_known, 'configurations': {}}
+    with multiprocessing.Pool(workers) as pool:
+        for name in configurations:
+            rows, cols, mines = CONFIGURATIONS[name]
+            tasks = [(rows, cols, mines, seed + i, mine_count_known) for i in range(games)]
+            start = time.perf_counter()
+            results = pool.map(play_game, tasks, chunksize=max(1, games // (workers * 4)))
+            summary = summarize(results, time.perf_counter() - start)
+            summary['board'] = {'rows': rows, 'cols': cols, 'mines': mines}
+            report['configurations'][name] = summary
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=100, help='games per configuration')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGURATIONS), default=list(CONFIGURATIONS))
+    parser.add_argument('--unknown-mine-count', action='store_true', help='play without the total mine count')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.configs, args.games, args.workers, args.seed, not args.unknown_mine_count)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
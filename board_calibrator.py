@@ -0,0 +1,152 @@
+import numpy as np
+
+from cell_classifier import EMPTY_TILE_COLOR, UNCLICKED_COLOR
+
+
+class BoardCalibrator:
+    """
+    Finds the board rectangle, grid pitch, rows and columns in a single screenshot.
+
+    Tile pixels are found by colour. When tiles have borders, the rows and
+    columns that cross them drop out of the tile mask at the grid pitch, so
+    the pitch is the strongest period of the mask's projections and gaps up
+    to half of it are bridged to get the board rectangle. Boards with
+    borderless tiles give an unbroken mask; their pitch is the strongest
+    period of the edge projection inside the rectangle, since every cell
+    boundary adds an edge at the same offset. A result whose extent is not a
+    whole number of cells, or that has fewer than min_cells rows or columns,
+    is rejected.
+    """
+
+    def __init__(self, tile_colors=(UNCLICKED_COLOR, EMPTY_TILE_COLOR), min_cell_size=12, max_cell_size=128,
+                 edge_stride=4, min_cells=5, tolerance=2):
+        self.tile_colors = tile_colors
+        self.min_cell_size = min_cell_size
+        self.max_cell_size = max_cell_size
+        self.edge_stride = edge_stride
+        self.min_cells = min_cells
+        # Pixels the board extent may be off from a whole number of cells
+        self.tolerance = tolerance
+
+    def tile_mask(self, frame):
+        """Pixels that have one of the tile colours, compared channel by channel to stay in uint8."""
+        mask = np.zeros(frame.shape[:2], dtype=bool)
+        for r, g, b in self.tile_colors:
+            mask |= (frame[..., 0] == r) & (frame[..., 1] == g) & (frame[..., 2] == b)
+        return mask
+
+    @staticmethod
+    def runs(active):
+        """(starts, ends) of the runs of True values, ends exclusive."""
+        padded = np.concatenate(([False], active, [False])).astype(np.int8)
+        changes = np.flatnonzero(np.diff(padded))
+        return changes[::2], changes[1::2]
+
+    @classmethod
+    def longest_run(cls, active, max_gap=0):
+        """(start, end) of the longest run of True values, end exclusive, bridging gaps up to max_gap."""
+        starts, ends = cls.runs(active)
+        if len(starts) == 0:
+            return None
+
+        # Merge runs separated by short gaps such as grid lines and tile bevels
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] > max_gap))
+        starts = starts[keep]
+        ends = ends[np.concatenate((keep[1:], [True]))]
+        best = np.argmax(ends - starts)
+        return int(starts[best]), int(ends[best])
+
+    def find_pitch(self, profile):
+        """Strongest period of a profile, from the peaks of its autocorrelation. None if it has no period."""
+        profile = profile - profile.mean()
+        length = len(profile)
+        spectrum = np.fft.rfft(profile, 2 * length)
+        correlation = np.fft.irfft(spectrum * np.conj(spectrum))[:length]
+
+        lags = np.arange(self.min_cell_size, min(self.max_cell_size, length // 2) + 1)
+        if len(lags) < 3:
+            return None
+        scores = correlation[lags]
+        peaks = np.flatnonzero((scores[1:-1] > scores[:-2]) & (scores[1:-1] >= scores[2:]) & (scores[1:-1] > 0)) + 1
+        if len(peaks) == 0:
+            return None
+        # Multiples of the pitch score about as high, so take the first peak close to the best one
+        best = scores[peaks].max()
+        return int(lags[peaks[np.argmax(scores[peaks] >= 0.9 * best)]])
+
+    def edge_pitch(self, board):
+        """Grid pitch from the cell boundary edges inside the board rectangle, or None."""
+        # A sample of every few rows (or columns) of a grey image is enough to see them
+        stride = self.edge_stride
+        vertical_edges = np.abs(np.diff(board[::stride].sum(axis=2, dtype=np.int16), axis=1)).sum(axis=0)
+        horizontal_edges = np.abs(np.diff(board[:, ::stride].sum(axis=2, dtype=np.int16), axis=0)).sum(axis=1)
+        pitches = [pitch for pitch in (self.find_pitch(vertical_edges), self.find_pitch(horizontal_edges)) if pitch]
+        if not pitches:
+            return None
+        return int(round(np.median(pitches)))
+
+    def fit_cells(self, active, run, pitch):
+        """
+        (first pixel, cell count) of the cells along one axis, from the bridged
+        run of tile pixels. The gaps between the runs are the tile borders; the
+        run misses the outer half of a border on either side. None if the
+        extent is not a whole number of cells.
+        """
+        start, end = run
+        starts, ends = self.runs(active[start:end])
+        gap = max(pitch - int(np.median(ends - starts)), 0) if len(starts) > 1 else 0
+        extent = end - start + gap
+        cells = int(round(extent / pitch))
+        if cells < 1 or abs(extent - cells * pitch) > self.tolerance:
+            return None
+        return start - gap // 2, cells
+
+    def calibrate(self, frame):
+        """
+        Returns a dict with top_left, bottom_right (the origin of the last cell,
+        like the manually picked corners), cell_size, rows and columns, or None
+        if no board was found.
+        """
+        tiles = self.tile_mask(frame)
+
+        row_hits = tiles.sum(axis=1)
+        if not row_hits.max():
+            return None
+        active_rows = row_hits > 0.5 * row_hits.max()
+        col_hits = tiles[active_rows].sum(axis=0)
+        active_cols = col_hits > 0.5 * col_hits.max()
+
+        # Tile borders break the mask at the grid pitch
+        pitches = [self.find_pitch(active.astype(np.float32)) for active in (active_rows, active_cols)]
+        pitch = None
+        if all(pitches) and abs(pitches[0] - pitches[1]) <= self.tolerance:
+            pitch = int(round(np.mean(pitches)))
+        max_gap = pitch // 2 if pitch else self.min_cell_size // 2
+
+        rows_run = self.longest_run(active_rows, max_gap)
+        col_hits = tiles[rows_run[0]:rows_run[1]].sum(axis=0)
+        active_cols = col_hits > 0.5 * col_hits.max()
+        cols_run = self.longest_run(active_cols, max_gap)
+        if cols_run is None:
+            return None
+
+        if pitch is None:
+            pitch = self.edge_pitch(frame[rows_run[0]:rows_run[1], cols_run[0]:cols_run[1], :3])
+            if pitch is None:
+                return None
+
+        fitted_rows = self.fit_cells(active_rows, rows_run, pitch)
+        fitted_cols = self.fit_cells(active_cols, cols_run, pitch)
+        if fitted_rows is None or fitted_cols is None:
+            return None
+        top, rows = fitted_rows
+        left, columns = fitted_cols
+        if rows < self.min_cells or columns < self.min_cells:
+            return None
+        return {
+            'top_left': (left, top),
+            'bottom_right': (left + (columns - 1) * pitch, top + (rows - 1) * pitch),
+            'cell_size': pitch,
+            'rows': rows,
+            'columns': columns,
+        }
@@ -0,0 +1,181 @@
+import numpy as np
+
+
+# Codes used in the packed code plane
+UNKNOWN = -2
+FLAG = -1
+
+NEIGHBOUR_DX = np.array([-1, -1, -1, 0, 0, 1, 1, 1])
+NEIGHBOUR_DY = np.array([-1, 0, 1, -1, 1, -1, 0, 1])
+
+
+class BoardModel:
+    """
+    Compact board representation the analyzers run on.
+
+    The grid is kept as boolean planes for revealed, flagged and unknown cells
+    plus a uint8 plane with the revealed numbers. Neighbour counts are 3x3
+    box sums over a plane, so they come out for the whole board at once.
+
+    After the first load the model is updated incrementally: only cells that
+    differ from the previous grid are written, and the flag/unknown neighbour
+    counts, residuals and frontier are adjusted around them, so the work per
+    move follows the size of the change rather than the size of the board.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+
+        self.codes = np.full((rows, cols), UNKNOWN, dtype=np.int8)
+        self.revealed = np.zeros((rows, cols), dtype=bool)
+        self.flagged = np.zeros((rows, cols), dtype=bool)
+        self.unknown = np.ones((rows, cols), dtype=bool)
+        self.numbers = np.zeros((rows, cols), dtype=np.uint8)
+
+        # Neighbour counts, number minus adjacent flags, and the revealed cells that
+        # still have unknown neighbours; kept up to date cell by cell after the first load
+        self.flag_counts = None
+        self.unknown_counts = None
+        self.residual = None
+        self.frontier = set()
+        # (version, cells whose neighbourhood changed) for every incremental update since the last rebuild
+        self.changes = []
+        self.rebuilt_version = 0
+
+        # Bumped on every change so derived results can be cached
+        self.version = 0
+        self._constraints = None
+        self._constraints_version = None
+
+        # Neighbour coordinates of every cell, computed once
+        self.neighbours = [[self._compute_neighbours(x, y) for y in range(cols)] for x in range(rows)]
+
+    def _compute_neighbours(self, x, y):
+        return tuple((adj_x, adj_y)
+                     for adj_x in range(max(x - 1, 0), min(x + 2, self.rows))
+                     for adj_y in range(max(y - 1, 0), min(y + 2, self.cols))
+                     if (adj_x, adj_y) != (x, y))
+
+    def load(self, grid):
+        """Bring the planes up to date with a list-of-lists grid (None for unknown, -1 for flags)."""
+        codes = [[UNKNOWN if value is None else value for value in row] for row in grid[:self.rows]]
+        codes = np.array(codes, dtype=np.int8).reshape(self.rows, self.cols)
+        changed = np.argwhere(codes != self.codes)
+        if self.flag_counts is None or len(changed) > self.rows * self.cols // 4:
+            self.codes = codes
+            self._update_planes()
+        elif len(changed):
+            self._update_cells(changed[:, 0], changed[:, 1], codes[changed[:, 0], changed[:, 1]])
+
+    def _update_planes(self):
+        """Recompute every plane, the neighbour counts and the frontier from the codes."""
+        self.unknown = self.codes == UNKNOWN
+        self.flagged = self.codes == FLAG
+        self.revealed = self.codes >= 0
+        self.numbers = np.where(self.revealed, self.codes, 0).astype(np.uint8)
+        self.flag_counts, self.unknown_counts = self.neighbour_count(np.stack([self.flagged, self.unknown]))
+        self.flag_counts = self.flag_counts.astype(np.int16)
+        self.unknown_counts = self.unknown_counts.astype(np.int16)
+        self.residual = self._residual(slice(None), slice(None))
+        self.frontier = set(self.cells(self.revealed & (self.unknown_counts > 0)))
+        self.version += 1
+        self.rebuilt_version = self.version
+        self.changes = []
+
+    def _update_cells(self, xs, ys, codes):
+        """
+        Apply a few changed cells: the planes are written at the cells, and the
+        neighbour counts, residuals and frontier membership only around them.
+        """
+        old = self.codes[xs, ys]
+        flag_delta = (codes == FLAG).astype(np.int16) - (old == FLAG)
+        unknown_delta = (codes == UNKNOWN).astype(np.int16) - (old == UNKNOWN)
+
+        self.codes[xs, ys] = codes
+        self.unknown[xs, ys] = codes == UNKNOWN
+        self.flagged[xs, ys] = codes == FLAG
+        self.revealed[xs, ys] = codes >= 0
+        self.numbers[xs, ys] = np.maximum(codes, 0)
+
+        # Every changed cell and its in-board neighbours, as flat indices into the planes
+        nx = (xs[:, None] + NEIGHBOUR_DX).ravel()
+        ny = (ys[:, None] + NEIGHBOUR_DY).ravel()
+        inside = (nx >= 0) & (nx < self.rows) & (ny >= 0) & (ny < self.cols)
+        neighbours = (nx * self.cols + ny)[inside]
+        np.add.at(self.flag_counts.ravel(), neighbours, np.repeat(flag_delta, 8)[inside])
+        np.add.at(self.unknown_counts.ravel(), neighbours, np.repeat(unknown_delta, 8)[inside])
+
+        flat = np.unique(np.concatenate((xs * self.cols + ys, neighbours)))
+        cells = np.divmod(flat, self.cols)
+        self.residual[cells] = self._residual(*cells)
+        on_frontier = self.revealed[cells] & (self.unknown_counts[cells] > 0)
+        touched = list(zip(cells[0].tolist(), cells[1].tolist()))
+        for cell, on in zip(touched, on_frontier.tolist()):
+            if on:
+                self.frontier.add(cell)
+            else:
+                self.frontier.discard(cell)
+        self.version += 1
+        self.changes.append((self.version, touched))
+
+    def _residual(self, xs, ys):
+        """Number minus adjacent flags, or -1 where there is no revealed number above 0."""
+        numbers = self.revealed[xs, ys] & (self.numbers[xs, ys] > 0)
+        return np.where(numbers, self.numbers[xs, ys].astype(np.int16) - self.flag_counts[xs, ys], -1)
+
+    def touched_since(self, version):
+        """
+        Cells whose neighbourhood changed after the given model version, for
+        incremental consumers, or None if the planes were rebuilt since then.
+        """
+        if version is None or version < self.rebuilt_version:
+            return None
+        touched = set()
+        for changed_version, cells in reversed(self.changes):
+            if changed_version <= version:
+                break
+            touched.update(cells)
+        return touched
+
+    def constraints(self):
+        """
+        The board as a constraint problem for the solvers: (constraints,
+        unknown cells, flag count), where every frontier number gives a
+        (unknown neighbour cells, mines among them) constraint. Cached until
+        the board changes; callers must not modify the result.
+        """
+        if self._constraints_version != self.version:
+            unknown = self.unknown
+            constraints = []
+            for x, y in sorted(self.frontier):
+                cells = tuple(cell for cell in self.neighbours[x][y] if unknown[cell])
+                constraints.append((cells, int(self.numbers[x, y]) - int(self.flag_counts[x, y])))
+            self._constraints = (constraints, self.cells(unknown), int(self.flagged.sum()))
+            self._constraints_version = self.version
+        return self._constraints
+
+    def set_flag(self, x, y):
+        if self.codes[x, y] != FLAG:
+            self._update_cells(np.array([x]), np.array([y]), np.array([FLAG], dtype=np.int8))
+
+    def neighbour_count(self, plane):
+        """
+        Number of set neighbours of every cell (3x3 box sum without the centre).
+        Several planes can be stacked along the leading axes and counted in one pass.
+        """
+        plane = plane.astype(np.uint8)
+        pad = [(0, 0)] * (plane.ndim - 2) + [(1, 1), (1, 1)]
+        padded = np.pad(plane, pad)
+        counts = np.zeros(plane.shape, dtype=np.uint8)
+        for dx in range(3):
+            for dy in range(3):
+                if dx == 1 and dy == 1:
+                    continue
+                counts += padded[..., dx:dx + self.rows, dy:dy + self.cols]
+        return counts
+
+    @staticmethod
+    def cells(mask):
+        """(x, y) coordinates of the set cells of a mask."""
+        return [(x, y) for x, y in np.argwhere(mask).tolist()]
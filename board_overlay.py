@@ -0,0 +1,88 @@
+import numpy as np
+
+
+HINT_COLOURS = {'mine': 'red', 'safe': 'green', 'chord': 'blue'}
+
+
+def diff_hints(old, new):
+    """(cells to hide, {cell: fill} to set) that turn the hints old into new."""
+    removed = [cell for cell in old if cell not in new]
+    changed = {cell: fill for cell, fill in new.items() if old.get(cell) != fill}
+    return removed, changed
+
+
+def heat_colour(probability, levels=10):
+    """Green (safe) to red (mine), rounded to a few levels so small changes don't repaint the cell."""
+    level = round(probability * levels) / levels
+    return f'#{int(255 * level):02x}{int(255 * (1 - level)):02x}00'
+
+
+class BoardOverlay:
+    """
+    Retained-mode hint layer on a Tk canvas.
+
+    Every cell gets at most one rectangle, created the first time it shows a
+    hint and kept in a rows x cols array of item ids afterwards. show() is
+    given the fill of every cell that should be visible and only reconfigures
+    the cells whose fill changed. The hovered cell is found by integer
+    division and hidden, so the cell under the mouse stays visible.
+    """
+
+    def __init__(self, canvas, rows, cols, cell_size):
+        self.canvas = canvas
+        self.rows = rows
+        self.cols = cols
+        self.cell_size = cell_size
+
+        self.items = np.zeros((rows, cols), dtype=np.int64)  # 0 = no rectangle yet
+        self.fills = {}  # (row, col) -> fill of every visible hint
+        self.hovered = None
+
+    def item(self, row, col):
+        if not self.items[row, col]:
+            size = self.cell_size
+            self.items[row, col] = self.canvas.create_rectangle(
+                col * size, row * size, (col + 1) * size, (row + 1) * size,
+                fill='', stipple='gray50', width=0, state='hidden'
+            )
+        return int(self.items[row, col])
+
+    def show(self, fills):
+        """Make the overlay show exactly the given {(row, col): fill} hints."""
+        self.apply(*diff_hints(self.fills, fills))
+
+    def apply(self, removed, changed):
+        """Hide the removed cells and set the fill of the changed ones."""
+        for cell in removed:
+            if self.fills.pop(cell, None) is not None:
+                self.canvas.itemconfig(int(self.items[cell]), state='hidden')
+        for cell, fill in changed.items():
+            state = 'hidden' if cell == self.hovered else 'normal'
+            self.canvas.itemconfig(self.item(*cell), fill=fill, state=state)
+            self.fills[cell] = fill
+
+    def clear(self):
+        self.show({})
+
+    def cell_at(self, window_x, window_y):
+        """(row, col) under a window position, or None outside the board."""
+        row = int(window_y // self.cell_size)
+        col = int(window_x // self.cell_size)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
+    def hover(self, window_x, window_y):
+        cell = self.cell_at(window_x, window_y)
+        if cell == self.hovered:
+            return
+        if self.hovered in self.fills:
+            self.canvas.itemconfig(int(self.items[self.hovered]), state='normal')
+        if cell in self.fills:
+            self.canvas.itemconfig(int(self.items[cell]), state='hidden')
+        self.hovered = cell
+
+    def leave(self):
+        if self.hovered in self.fills:
+            self.canvas.itemconfig(int(self.items[self.hovered]), state='normal')
+        self.hovered = None
@@ -1,19 +1,52 @@
-from PIL import ImageGrab, Image, ImageDraw
+from PIL import Image, ImageDraw
 import numpy as np
 
+from board_calibrator import BoardCalibrator
+from calibration_cache import CalibrationCache
+from cell_classifier import CellClassifier, UNREVEALED, labels_to_grid, pack_rgb
+from instrumentation import instruments
+from screen_capture import PilCapture
+
+
+def dilate(mask):
+    """Grow a boolean mask by one cell in all eight directions."""
+    padded = np.pad(mask, 1)
+    rows, cols = mask.shape
+    grown = np.zeros_like(mask)
+    for dx in range(3):
+        for dy in range(3):
+            grown |= padded[dx:dx + rows, dy:dy + cols]
+    return grown
+
 
 class BoardProcessor:
 
-    def __init__(self, cell_size=52):
+    def __init__(self, cell_size=52, incremental=False, classifier=None, capture=None, band_rows=8):
         self.cell_size = cell_size
+        self.incremental = incremental
+        # Incremental refreshes grab one rectangle per band of this many rows
+        self.band_rows = band_rows
 
         self.columns = 0
         self.rows = 0
         self.game_grid = [[]]
         self.corners = []
+        self.calibrator = BoardCalibrator()
+        self.calibration_cache = CalibrationCache()
 
         self.flag_positions = []
 
+        # Anything with classify/classify_cells works here, e.g. a TileRecognizer
+        self.classifier = classifier if classifier is not None else CellClassifier()
+        # Screen capture backend, see screen_capture.py
+        self.capture = capture if capture is not None else PilCapture()
+
+        # State kept between frames for incremental refreshes
+        self.labels = None
+        self.signature = None
+        self.dirty = None
+        self.applied_flags = []
+
 
     def initialize_board(self):
         # Extract the two corners
@@ -22,13 +55,16 @@ class BoardProcessor:
 
         exact_corner_color = [(112, 120, 128), (30, 38, 46)]
 
-        img = ImageGrab.grab()
+        img = self.capture.grab()
+
+        def pixel(position):
+            return tuple(img[position[1], position[0]])
 
         ok = False
         for i in range(self.cell_size):
             for j in range(self.cell_size):
                 print(top_left[0] - i, top_left[1])
-                if img.getpixel((top_left[0] - i, top_left[1])) in exact_corner_color and img.getpixel(
+                if pixel((top_left[0] - i, top_left[1])) in exact_corner_color and pixel(
                         (top_left[0], top_left[1] - j)) in exact_corner_color:
                     top_left = (top_left[0] - i - 4, top_left[1] - j - 4)
                     print(f'Top left corner: {top_left}')
@@ -40,7 +76,7 @@ class BoardProcessor:
         ok = False
         for i in range(self.cell_size):
             for j in range(self.cell_size):
-                if img.getpixel((bottom_right[0] - i, bottom_right[1])) in exact_corner_color and img.getpixel(
+                if pixel((bottom_right[0] - i, bottom_right[1])) in exact_corner_color and pixel(
                         (bottom_right[0], bottom_right[1] - j)) in exact_corner_color:
                     bottom_right = (bottom_right[0] - i, bottom_right[1] - j)
                     print(f'Bottom right corner: {bottom_right}')
@@ -58,53 +94,230 @@ class BoardProcessor:
         self.game_grid = [[None for _ in range(self.columns)] for _ in range(self.rows)]
 
         self.corners = [top_left, bottom_right]
+        self.reset_refresh_state()
+
+
+    def auto_calibrate(self, frame=None):
+        """
+        Find the board in a single screenshot, without picking corners by hand.
+        Returns False if no board was found.
+        """
+        if frame is None:
+            frame = self.capture.grab()
+        calibration = self.calibrator.calibrate(frame)
+        if calibration is None:
+            print("No board found on screen")
+            return False
+
+        self.corners = [calibration['top_left'], calibration['bottom_right']]
+        self.cell_size = calibration['cell_size']
+        self.rows = calibration['rows']
+        self.columns = calibration['columns']
+        self.game_grid = [[None for _ in range(self.columns)] for _ in range(self.rows)]
+        self.reset_refresh_state()
+        print(f"Calibrated board: {self.rows}x{self.columns} cells of {self.cell_size}px at {self.corners[0]}")
+        return True
+
+    def probe_palette(self, margin=6):
+        """
+        Short pixel strips across the board edge: over the left and top edges
+        of the first cell and the right and bottom edges of the last one.
+        Each strip holds both the window frame and the tile, so a board that
+        moved by any amount no longer matches. A strip also changes when its
+        corner cell gets revealed, which only costs a recalibration.
+        """
+        left, top = self.corners[0]
+        right = left + self.columns * self.cell_size
+        bottom = top + self.rows * self.cell_size
+        half = self.cell_size // 2
+        strips = [
+            (left - margin, top + half, left + margin, top + half + 1),
+            (left + half, top - margin, left + half + 1, top + margin),
+            (right - margin, bottom - half - 1, right + margin, bottom - half),
+            (right - half - 1, bottom - margin, right - half, bottom + margin),
+        ]
+        return [self.capture.grab(strip).reshape(-1, 3).tolist() for strip in strips]
+
+    def save_calibration(self):
+        self.calibration_cache.store(self.capture.screen_size(), {
+            'corners': [list(corner) for corner in self.corners],
+            'cell_size': self.cell_size,
+            'rows': self.rows,
+            'columns': self.columns,
+            'palette': self.probe_palette(),
+        })
+
+    def load_cached_calibration(self):
+        """
+        Reuse a cached calibration for this screen if its pixel probe still matches.
+        Entries that fail the probe are dropped. Returns True on a hit.
+        """
+        screen_size = self.capture.screen_size()
+        previous = (self.corners, self.cell_size, self.rows, self.columns)
+        for calibration in self.calibration_cache.candidates(screen_size):
+            self.corners = [tuple(corner) for corner in calibration['corners']]
+            self.cell_size = calibration['cell_size']
+            self.rows = calibration['rows']
+            self.columns = calibration['columns']
+            if self.probe_palette() == calibration['palette']:
+                self.game_grid = [[None for _ in range(self.columns)] for _ in range(self.rows)]
+                self.reset_refresh_state()
+                print(f"Using cached calibration: {self.rows}x{self.columns} cells at {self.corners[0]}")
+                return True
+            self.calibration_cache.invalidate(screen_size, calibration)
+
+        self.corners, self.cell_size, self.rows, self.columns = previous
+        return False
+
+    def reset_refresh_state(self):
+        self.labels = None
+        self.signature = None
+        self.dirty = np.zeros((self.rows, self.columns), dtype=bool)
+        self.applied_flags = []
+
+    def mark_dirty(self, row, col, radius=1):
+        """Mark a clicked cell (and its neighbours, for chords) to be re-sampled on the next refresh."""
+        if self.dirty is None or self.dirty.shape != (self.rows, self.columns):
+            self.dirty = np.zeros((self.rows, self.columns), dtype=bool)
+        self.dirty[max(row - radius, 0):row + radius + 1, max(col - radius, 0):col + radius + 1] = True
 
+    def cell_signature(self, frame):
+        """One packed pixel per cell of a frame grabbed on cell boundaries, used as a cheap frame-diff checksum."""
+        offset = self.cell_size // 2
+        return pack_rgb(frame[offset::self.cell_size, offset::self.cell_size, :3])
+
+    def cell_bbox(self, top, left, bottom, right):
+        """Screen rectangle of the cells in rows top:bottom and columns left:right."""
+        origin = self.corners[0]
+        return (origin[0] + left * self.cell_size, origin[1] + top * self.cell_size,
+                origin[0] + right * self.cell_size, origin[1] + bottom * self.cell_size)
+
+    def grab_cells(self, top, left, bottom, right):
+        with instruments.timer('board.capture'):
+            return self.capture.grab(self.cell_bbox(top, left, bottom, right))
+
+    def changing_regions(self):
+        """
+        Cell rectangles (top, left, bottom, right) covering every cell that can
+        still change: unrevealed and not flagged, or just clicked. Each band of
+        band_rows rows gets one rectangle, so a few scattered cells don't pull
+        in the whole board.
+        """
+        changing = self.labels == UNREVEALED
+        for row, col in self.flag_positions:
+            changing[row, col] = False
+        changing |= self.dirty
+
+        regions = []
+        for top in range(0, self.rows, self.band_rows):
+            band = changing[top:top + self.band_rows]
+            rows = np.flatnonzero(band.any(axis=1))
+            cols = np.flatnonzero(band.any(axis=0))
+            if len(rows):
+                regions.append((top + int(rows[0]), int(cols[0]), top + int(rows[-1]) + 1, int(cols[-1]) + 1))
+        return regions
+
+    def region_pixels(self, cells):
+        """
+        One packed centre pixel per given (row, col) cell, grabbed from the
+        smallest screen rectangle that covers them.
+        """
+        cells = np.asarray(cells, dtype=np.intp).reshape(-1, 2)
+        top, left = cells.min(axis=0)
+        bottom, right = cells.max(axis=0) + 1
+        frame = self.capture.grab(self.cell_bbox(top, left, bottom, right))
+
+        offset = self.cell_size // 2
+        ys = (cells[:, 0] - top) * self.cell_size + offset
+        xs = (cells[:, 1] - left) * self.cell_size + offset
+        return pack_rgb(frame[ys, xs, :3])
+
+    def refresh_dirty_cells(self, regions):
+        """
+        Grab only the given cell rectangles (see changing_regions) and
+        re-classify the cells in them that changed since the last frame.
+
+        Returns (labels, signature); labels is None if a full rescan is
+        needed, or False if a bomb was hit.
+        """
+        with instruments.timer('board.capture'):
+            frames = self.capture.grab_regions([self.cell_bbox(*region) for region in regions])
+        with instruments.timer('board.classify'):
+            signature = self.signature.copy()
+            covered = np.zeros(self.labels.shape, dtype=bool)
+            for (top, left, bottom, right), frame in zip(regions, frames):
+                signature[top:bottom, left:right] = self.cell_signature(frame)
+                covered[top:bottom, left:right] = True
+            return self.refresh_labels(regions, frames, covered, signature), signature
+
+    def refresh_labels(self, regions, frames, covered, signature):
+        """Labels after re-classifying the changed cells inside the grabbed regions."""
+        unrevealed = self.labels == UNREVEALED
+        changed = signature != self.signature
+
+        # Revealed cells never change, so any difference there means the board moved or restarted
+        if (changed & ~unrevealed).any():
+            return None
+
+        labels = self.labels.copy()
+        checked = np.zeros_like(unrevealed)
+        pending = (self.dirty | changed) & unrevealed & covered
+        while pending.any():
+            opened = np.zeros_like(pending)
+            for (top, left, bottom, right), frame in zip(regions, frames):
+                cells = np.argwhere(pending[top:bottom, left:right])
+                if not len(cells):
+                    continue
+                new_labels, bomb_found = self.classifier.classify_cells(frame, cells, self.cell_size)
+                instruments.count('cells_scanned', len(cells))
+                if bomb_found:
+                    return False
+                cells += (top, left)
+                labels[cells[:, 0], cells[:, 1]] = new_labels
+                opened[cells[:, 0], cells[:, 1]] = new_labels == 0
+            checked |= pending
+
+            # A revealed 0 opens its neighbours, so follow the flood-fill frontier
+            pending = dilate(opened) & (labels == UNREVEALED) & covered & ~checked
+
+        return labels
 
     def update_game_board(self):
-        top_left = self.corners[0]
-        bottom_right = self.corners[1]
+        labels = None
+        if self.incremental and self.labels is not None and self.labels.shape == (self.rows, self.columns):
+            # Revealed cells never change, so only the rectangles around the cells that can are grabbed
+            regions = self.changing_regions()
+            if regions:
+                labels, signature = self.refresh_dirty_cells(regions)
+                if labels is False:
+                    return False
+
+        if labels is None:
+            frame = self.grab_cells(0, 0, self.rows, self.columns)
+            with instruments.timer('board.classify'):
+                signature = self.cell_signature(frame)
+                # Label every cell in one batched pass over the frame
+                labels, bomb_found = self.classifier.classify(frame, self.rows, self.columns, self.cell_size)
+                instruments.count('cells_scanned', self.rows * self.columns)
+                if bomb_found:
+                    return False
+
+        previous = self.labels
+        self.labels = labels
+        self.signature = signature
+        self.dirty = np.zeros(labels.shape, dtype=bool)
 
-        # Capture the screen and get colors for the Minesweeper grid
-        bbox = (top_left[0], top_left[1], top_left[0] + (self.columns * self.cell_size), top_left[1] + (self.rows * self.cell_size))
-        img = ImageGrab.grab(bbox)
-
-        for row in range(self.rows):
-            for col in range(self.columns):
-                # Calculate the pixel position for the current cell in the screenshot
-                pixel_x = col * self.cell_size + self.cell_size // 2
-                pixel_y = row * self.cell_size + self.cell_size // 2
-
-                whitelisted_colors = [(124, 199, 255), (102, 194, 102), (255, 119, 136), (238, 136, 255),
-                                      (221, 170, 34), (102, 204, 204), (153, 153, 153), (208, 216, 224)]
-                unclicked_color = (76, 84, 92)
-                empty_tile_color = (56, 64, 72)
-                bomb_color = (0, 0, 0)
-
-                # Get the pixel color of the current cell and the nearest pixels and average them
-                nonbackground_pixels = 0
-                pixel_color = np.array([0, 0, 0])
-                for i in range(10):
-                    for j in range(10):
-                        if img.getpixel((pixel_x + i, pixel_y + j)) == bomb_color:
-                            return False
-
-                        if img.getpixel((pixel_x + i,
-                                         pixel_y + j)) in whitelisted_colors:  # Avoid the specific background color
-                            nonbackground_pixels += 1
-                            pixel_color += np.array(img.getpixel((pixel_x + i, pixel_y + j)))
-                        if img.getpixel((pixel_x + i, pixel_y + j)) == unclicked_color:
-                            nonbackground_pixels = -1
-                            self.game_grid[row][col] = None
-                            break
-
-                if nonbackground_pixels > 0:
-                    pixel_color = tuple(pixel_color // nonbackground_pixels)
-                    self.game_grid[row][col] = whitelisted_colors.index(tuple(pixel_color)) + 1
-                elif nonbackground_pixels == 0:
-                    self.game_grid[row][col] = 0
+        if previous is not None and previous.shape == labels.shape and len(self.game_grid) == self.rows:
+            # Only write back the cells that changed, plus any cells flagged on the last frame
+            for row, col in np.argwhere(labels != previous).tolist() + self.applied_flags:
+                value = int(labels[row, col])
+                self.game_grid[row][col] = None if value == UNREVEALED else value
+        else:
+            self.game_grid = labels_to_grid(labels, self.game_grid)
 
         for flag in self.flag_positions:
             self.game_grid[flag[0]][flag[1]] = -1
+        self.applied_flags = [list(flag) for flag in self.flag_positions]
 
         return True
 
@@ -112,6 +325,7 @@ class BoardProcessor:
         self.columns = 0
         self.rows = 0
         self.game_grid = [[]]
+        self.reset_refresh_state()
 
         self.running = True
 
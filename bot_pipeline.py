@@ -0,0 +1,193 @@
+import queue
+import threading
+import time
+
+from action_scheduler import NoPacing
+
+
+class Snapshot:
+    """A classified frame: a copy of the grid, when it was taken and how many actions had been sent by then."""
+
+    def __init__(self, frame_id, grid, actions, captured_at):
+        self.frame_id = frame_id
+        self.grid = grid
+        self.actions = actions
+        self.captured_at = captured_at
+
+
+class BotPipeline:
+    """
+    Runs MinesweeperBot as three overlapping stages instead of one serial loop:
+
+    - a capture thread grabs and classifies the board and publishes a snapshot
+      whenever it changed,
+    - a solver thread analyzes the newest snapshot and queues the moves it finds,
+    - the calling thread takes moves off the queue and clicks them.
+
+    Only the newest snapshot is kept, and an analysis is dropped if a newer
+    snapshot arrived while it ran, so the cycle time is bounded by the slowest
+    stage rather than the sum of all stages. Certain moves are always safe to
+    act on, even from an older frame; a guess is only made from a snapshot
+    that was captured after every earlier action had settled on screen.
+
+    Like burst mode, actions are not paced unless a pacing is passed in.
+    """
+
+    def __init__(self, bot, settle_time=0.1, poll_interval=0.005, pacing=None, retry_time=0.5):
+        self.bot = bot
+        self.pacing = pacing if pacing is not None else NoPacing()
+        self.settle_time = settle_time
+        # A click whose cell still looks unclicked this long afterwards is taken as lost and sent again
+        self.retry_time = retry_time
+        self.poll_interval = poll_interval
+
+        # Capture and clicks both touch the board processor's refresh state
+        self.board_lock = threading.Lock()
+        self.snapshot_ready = threading.Condition()
+        self.snapshot = None
+        self.moves = queue.Queue()
+        self.stop = threading.Event()
+        self.outcome = None
+
+        self.actions = 0
+        self.last_action_at = 0.0
+        # (x, y) -> when it was clicked or flagged, so moves found again on older frames are not repeated
+        self.acted = {}
+
+        self.stage_times = {'capture': [], 'solve': [], 'act': []}
+        self.stale_analyses = 0
+
+    def finish(self, outcome):
+        if self.outcome is None:
+            self.outcome = outcome
+        self.stop.set()
+        with self.snapshot_ready:
+            self.snapshot_ready.notify_all()
+
+    def publish(self, snapshot):
+        with self.snapshot_ready:
+            self.snapshot = snapshot
+            self.snapshot_ready.notify_all()
+
+    def capture_loop(self):
+        board_processor = self.bot.board_processor
+        frame_id = 0
+        previous = None
+        while not self.stop.is_set():
+            start = time.perf_counter()
+            with self.board_lock:
+                actions = self.actions
+                ok = board_processor.update_game_board()
+                grid = [row[:] for row in board_processor.game_grid]
+            self.stage_times['capture'].append(time.perf_counter() - start)
+
+            if not ok:
+                self.finish('game_over')
+                return
+            # An unchanged board is published once more when it settles, so a guess can be made from it,
+            # and again after retry_time, so lost clicks are noticed
+            since_action = start - self.last_action_at
+            state = (grid, actions, since_action >= self.settle_time, since_action >= self.retry_time)
+            if state != previous:
+                frame_id += 1
+                self.publish(Snapshot(frame_id, grid, actions, start))
+                previous = state
+            else:
+                time.sleep(self.poll_interval)
+
+    def solve_loop(self):
+        analyzer = self.bot.analyzer
+        solved = 0
+        while not self.stop.is_set():
+            with self.snapshot_ready:
+                while not self.stop.is_set() and (self.snapshot is None or self.snapshot.frame_id == solved):
+                    self.snapshot_ready.wait()
+                if self.stop.is_set():
+                    return
+                snapshot = self.snapshot
+            solved = snapshot.frame_id
+
+            start = time.perf_counter()
+            analyzer.update(snapshot.grid)
+            clicks, flags = self.bot.find_burst_moves()
+            guess = None
+            if not clicks and not flags:
+                if not any(cell is None for row in snapshot.grid for cell in row):
+                    self.finish('complete')
+                    return
+                if self.is_settled(snapshot):
+                    # With no consistent board (a misread cell or a wrong flag) the snapshot is
+                    # not published again, so a random cell is guessed rather than waiting forever
+                    guess = analyzer.find_best_guess() or analyzer.find_random_move()
+            self.stage_times['solve'].append(time.perf_counter() - start)
+
+            if self.snapshot.frame_id != snapshot.frame_id:
+                self.stale_analyses += 1
+                continue
+            if clicks or flags or guess:
+                self.moves.put((snapshot, clicks, flags, guess))
+
+    def is_settled(self, snapshot):
+        """Whether the snapshot already shows the effect of every action sent so far."""
+        return snapshot.actions == self.actions and snapshot.captured_at - self.last_action_at >= self.settle_time
+
+    def act(self, x, y, flag=False):
+        if (x, y) in self.acted:
+            return
+        with self.board_lock:
+            self.bot.click_cell(y, x, flag=flag)
+            self.actions += 1
+            self.last_action_at = time.perf_counter()
+        self.acted[(x, y)] = self.last_action_at
+        self.pacing.after_action()
+
+    def forget_lost_actions(self, snapshot):
+        """
+        Forget actions that a snapshot taken retry_time after them shows no
+        effect of, so they are sent again. Actions that did register are
+        forgotten too, as they will not come up again.
+        """
+        for (x, y), acted_at in list(self.acted.items()):
+            if snapshot.captured_at - acted_at >= self.retry_time:
+                if snapshot.grid[x][y] is None:
+                    print(f"Click at ({x}, {y}) did not register, retrying")
+                del self.acted[(x, y)]
+
+    def act_loop(self):
+        while not self.stop.is_set() and self.bot.running:
+            try:
+                snapshot, clicks, flags, guess = self.moves.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            start = time.perf_counter()
+            self.forget_lost_actions(snapshot)
+            for x, y in flags:
+                self.act(x, y, flag=True)
+            for x, y in clicks:
+                self.act(x, y)
+            # A guess is only valid for the board it was made on
+            if guess is not None and snapshot.actions == self.actions:
+                print(f"Making probabilistic move at {guess}")
+                self.act(*guess)
+            self.stage_times['act'].append(time.perf_counter() - start)
+
+    def run(self):
+        """Play until the game ends. Returns 'game_over', 'complete' or None if stopped."""
+        threads = [threading.Thread(target=self.capture_loop, daemon=True),
+                   threading.Thread(target=self.solve_loop, daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            self.act_loop()
+        finally:
+            self.finish(self.outcome)
+            for thread in threads:
+                thread.join()
+        return self.outcome
+
+    def stats(self):
+        """Mean milliseconds per stage, and how many analyses were dropped as stale."""
+        report = {stage: 1000 * sum(times) / len(times) if times else 0.0 for stage, times in self.stage_times.items()}
+        report['stale_analyses'] = self.stale_analyses
+        return report
@@ -0,0 +1,57 @@
+import json
+import os
+
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.minesweeper_bot', 'calibration.json')
+
+
+def calibration_key(calibration):
+    """Entries are told apart by where the board is and how it is laid out."""
+    left, top = calibration['corners'][0]
+    return f"{left},{top}:{calibration['rows']}x{calibration['columns']}@{calibration['cell_size']}"
+
+
+class CalibrationCache:
+    """
+    Board calibrations persisted on disk, keyed by display resolution and the
+    board geometry. Entries are validated by the caller with a pixel probe
+    across the board edge and dropped when the probe no longer matches.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+
+    @staticmethod
+    def resolution_key(screen_size):
+        return f'{screen_size[0]}x{screen_size[1]}'
+
+    def candidates(self, screen_size):
+        """Cached calibrations for this resolution, most recent first."""
+        return list(self.entries.get(self.resolution_key(screen_size), {}).values())
+
+    def store(self, screen_size, calibration):
+        entries = self.entries.setdefault(self.resolution_key(screen_size), {})
+        key = calibration_key(calibration)
+        entries.pop(key, None)
+        entries[key] = calibration
+        # Keep the most recent entry first
+        self.entries[self.resolution_key(screen_size)] = {key: entries.pop(key), **entries}
+        self.save()
+
+    def invalidate(self, screen_size, calibration):
+        entries = self.entries.get(self.resolution_key(screen_size), {})
+        if entries.pop(calibration_key(calibration), None) is not None:
+            self.save()
@@ -0,0 +1,106 @@
+import numpy as np
+
+
+# Label used in the classified array for cells that are still unclicked
+UNREVEALED = -2
+
+WHITELISTED_COLORS = [(124, 199, 255), (102, 194, 102), (255, 119, 136), (238, 136, 255),
+                      (221, 170, 34), (102, 204, 204), (153, 153, 153), (208, 216, 224)]
+UNCLICKED_COLOR = (76, 84, 92)
+EMPTY_TILE_COLOR = (56, 64, 72)
+BOMB_COLOR = (0, 0, 0)
+
+# Codes stored in the colour lookup table
+_BACKGROUND = 0
+_UNCLICKED = 9
+_BOMB = 10
+
+
+def pack_rgb(frame):
+    """Pack an (..., 3) uint8 RGB array into (...) uint32 values."""
+    frame = frame.astype(np.uint32, copy=False)
+    return (frame[..., 0] << 16) | (frame[..., 1] << 8) | frame[..., 2]
+
+
+class CellClassifier:
+    """
+    Labels every cell of a captured board in one batched NumPy pass.
+
+    Each cell is sampled in a patch x patch square starting at its centre,
+    just like the old per-pixel loop, but all the patches are taken as one
+    strided view of the frame and looked up in a packed-RGB colour table.
+    """
+
+    def __init__(self, patch=10):
+        self.patch = patch
+
+        colors = list(WHITELISTED_COLORS) + [UNCLICKED_COLOR, BOMB_COLOR]
+        codes = list(range(1, len(WHITELISTED_COLORS) + 1)) + [_UNCLICKED, _BOMB]
+        keys = pack_rgb(np.array(colors, dtype=np.uint8))
+        order = np.argsort(keys)
+        self.lut_keys = keys[order]
+        self.lut_codes = np.array(codes, dtype=np.uint8)[order]
+
+    def patch_size(self, cell_size):
+        return min(self.patch, cell_size - cell_size // 2)
+
+    def extract_patches(self, frame, rows, cols, cell_size):
+        """Return a (rows, cols, p, p, 3) view with the sampled patch of every cell."""
+        p = self.patch_size(cell_size)
+        offset = cell_size // 2
+        grid = frame[:rows * cell_size, :cols * cell_size, :3]
+        grid = grid.reshape(rows, cell_size, cols, cell_size, 3)
+        return grid[:, offset:offset + p, :, offset:offset + p].transpose(0, 2, 1, 3, 4)
+
+    def gather_patches(self, frame, cells, cell_size):
+        """Return an (n, p, p, 3) array with the sampled patches of the given (row, col) cells."""
+        p = self.patch_size(cell_size)
+        offset = cell_size // 2
+        cells = np.asarray(cells, dtype=np.intp).reshape(-1, 2)
+        steps = np.arange(p)
+        ys = cells[:, 0, None] * cell_size + offset + steps
+        xs = cells[:, 1, None] * cell_size + offset + steps
+        return frame[ys[:, :, None], xs[:, None, :], :3]
+
+    def label_patches(self, patches):
+        """
+        Label a batch of (..., p, p, 3) patches.
+
+        Returns (labels, bombs) where labels holds UNREVEALED, 0 or 1-8 and
+        bombs is a boolean array marking patches that contain a bomb pixel.
+        """
+        packed = pack_rgb(patches)
+        index = np.searchsorted(self.lut_keys, packed)
+        index = np.minimum(index, len(self.lut_keys) - 1)
+        codes = np.where(self.lut_keys[index] == packed, self.lut_codes[index], _BACKGROUND)
+        codes = codes.reshape(codes.shape[:-2] + (-1,))
+
+        bombs = (codes == _BOMB).any(axis=-1)
+        unclicked = (codes == _UNCLICKED).any(axis=-1)
+
+        # Majority vote over the whitelisted number colours
+        votes = (codes[..., None] == np.arange(1, len(WHITELISTED_COLORS) + 1)).sum(axis=-2)
+        numbers = np.where(votes.any(axis=-1), votes.argmax(axis=-1) + 1, 0)
+
+        labels = np.where(unclicked, UNREVEALED, numbers).astype(np.int8)
+        return labels, bombs
+
+    def classify(self, frame, rows, cols, cell_size):
+        """Classify the whole board. Returns (labels, bomb_found)."""
+        labels, bombs = self.label_patches(self.extract_patches(frame, rows, cols, cell_size))
+        return labels, bool(bombs.any())
+
+    def classify_cells(self, frame, cells, cell_size):
+        """Classify only the given (row, col) cells. Returns (labels, bomb_found)."""
+        labels, bombs = self.label_patches(self.gather_patches(frame, cells, cell_size))
+        return labels, bool(bombs.any())
+
+
+def labels_to_grid(labels, grid=None):
+    """Convert a label array to the list-of-lists grid used by the analyzers (None for unclicked)."""
+    rows = [[None if v == UNREVEALED else v for v in row] for row in labels.tolist()]
+    if grid is None or len(grid) != len(rows):
+        return rows
+    for row, values in zip(grid, rows):
+        row[:] = values
+    return grid
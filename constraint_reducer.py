@@ -0,0 +1,228 @@
+from fractions import Fraction
+
+
+class ConstraintReducer:
+    """
+    Deductions that combine the constraints of neighbouring numbers.
+
+    Every frontier number is a linear constraint "sum of its unknown
+    neighbours = number - adjacent flags". Overlapping constraints are
+    reduced pairwise (subset differencing, and bounds on the shared cells
+    for partial overlaps), and what is left goes through Gaussian
+    elimination over the constraint matrix of each component.
+
+    The constraint store is updated incrementally: only the numbers around
+    cells that changed since the last update are rebuilt, and components
+    whose constraints did not change reuse their previous deductions.
+    """
+
+    def __init__(self, analyzer, max_rounds=10):
+        self.analyzer = analyzer
+        self.max_rounds = max_rounds
+
+        self.version = None
+        self.constraints = {}  # number cell -> (frozenset of unknown cells, mines left)
+        self.deductions = {}  # frozenset of component constraints -> (safe cells, mine cells)
+
+    def update(self):
+        """Bring the constraint store up to date with the analyzer's board model."""
+        model = self.analyzer.model
+        if self.version == model.version:
+            return
+        # The model lists the changed cells together with their neighbours
+        sources = model.touched_since(self.version)
+        if sources is None:
+            self.constraints = {}
+            self.deductions = {}
+            sources = [(x, y) for x in range(model.rows) for y in range(model.cols)]
+        self.version = model.version
+
+        for cell in sources:
+            self.rebuild(cell)
+
+    def rebuild(self, cell):
+        model = self.analyzer.model
+        x, y = cell
+        self.constraints.pop(cell, None)
+        if not model.revealed[x, y] or model.numbers[x, y] == 0:
+            return
+
+        unknown = []
+        mines = int(model.numbers[x, y])
+        for adj_x, adj_y in model.neighbours[x][y]:
+            if model.unknown[adj_x, adj_y]:
+                unknown.append((adj_x, adj_y))
+            elif model.flagged[adj_x, adj_y]:
+                mines -= 1
+        if unknown:
+            self.constraints[cell] = (frozenset(unknown), mines)
+
+    def split_components(self):
+        """Group the stored constraints into components that share unknown cells."""
+        owner = {}
+        components = []
+        for cells, mines in set(self.constraints.values()):
+            merged = {index for index in (owner.get(cell) for cell in cells) if index is not None}
+            group = {(cells, mines)}
+            for index in merged:
+                group |= components[index]
+                components[index] = None
+            components.append(group)
+            for member_cells, _ in group:
+                for cell in member_cells:
+                    owner[cell] = len(components) - 1
+        return [frozenset(component) for component in components if component is not None]
+
+    def find_moves(self):
+        """Returns (safe cells, mine cells) forced by combining constraints."""
+        deductions = {}
+        for component in self.split_components():
+            if component in self.deductions:
+                deductions[component] = self.deductions[component]
+            else:
+                deductions[component] = self.reduce(component)
+        self.deductions = deductions
+
+        safe_moves = set()
+        mines = set()
+        for safe, found_mines in deductions.values():
+            safe_moves |= safe
+            mines |= found_mines
+        return list(safe_moves), list(mines)
+
+    def reduce(self, component):
+        """Run pairwise reduction and Gaussian elimination on one component until nothing new is found."""
+        constraints = set(component)
+        safe = set()
+        mines = set()
+        for _ in range(self.max_rounds):
+            found_safe, found_mines, constraints = self.reduce_pairs(constraints)
+            if not found_safe and not found_mines:
+                found_safe, found_mines = self.eliminate(constraints)
+            if not found_safe and not found_mines:
+                break
+            safe |= found_safe
+            mines |= found_mines
+            constraints = self.substitute(constraints, found_safe, found_mines)
+        return frozenset(safe), frozenset(mines)
+
+    @staticmethod
+    def substitute(constraints, safe, mines):
+        """Remove known cells from the constraints."""
+        reduced = set()
+        for cells, value in constraints:
+            value -= len(cells & mines)
+            cells = cells - safe - mines
+            if cells:
+                reduced.add((cells, value))
+        return reduced
+
+    def reduce_pairs(self, constraints):
+        """
+        Subset differencing over overlapping constraint pairs.
+
+        A constraint contained in another is subtracted from it, and the
+        difference is kept as a new constraint. For partial overlaps the
+        possible number of mines in the shared cells bounds the cells only
+        one of the two constraints covers.
+        """
+        safe = set()
+        mines = set()
+        constraints = set(constraints)
+        for cells, value in constraints:
+            if value == 0:
+                safe |= cells
+            elif value == len(cells):
+                mines |= cells
+
+        cell_index = {}
+        for constraint in constraints:
+            for cell in constraint[0]:
+                cell_index.setdefault(cell, []).append(constraint)
+
+        derived = set()
+        checked = set()
+        for cells_a, value_a in constraints:
+            for other in {c for cell in cells_a for c in cell_index[cell]}:
+                cells_b, value_b = other
+                pair = frozenset(((cells_a, value_a), other))
+                if len(pair) < 2 or pair in checked:
+                    continue
+                checked.add(pair)
+
+                shared = cells_a & cells_b
+                only_a = cells_a - shared
+                only_b = cells_b - shared
+                if not only_a or not only_b:
+                    # Subset: the difference is a constraint of its own
+                    small, large = ((cells_a, value_a), other) if not only_a else (other, (cells_a, value_a))
+                    difference = (large[0] - small[0], large[1] - small[1])
+                    if difference[0] and difference not in constraints:
+                        derived.add(difference)
+                    continue
+
+                low = max(value_a - len(only_a), value_b - len(only_b), 0)
+                high = min(value_a, value_b, len(shared))
+                for only, value in ((only_a, value_a), (only_b, value_b)):
+                    if value - high == len(only):
+                        mines |= only
+                    elif value - low == 0:
+                        safe |= only
+
+        for cells, value in derived:
+            if value == 0:
+                safe |= cells
+            elif value == len(cells):
+                mines |= cells
+        return safe, mines, constraints | derived
+
+    @staticmethod
+    def eliminate(constraints):
+        """Gaussian elimination over the constraint matrix, then read forced cells off each reduced row."""
+        cells = sorted({cell for constraint_cells, _ in constraints for cell in constraint_cells})
+        if not cells:
+            return set(), set()
+        column = {cell: i for i, cell in enumerate(cells)}
+
+        matrix = []
+        for constraint_cells, value in constraints:
+            row = [Fraction(0)] * (len(cells) + 1)
+            for cell in constraint_cells:
+                row[column[cell]] = Fraction(1)
+            row[-1] = Fraction(value)
+            matrix.append(row)
+
+        pivot_row = 0
+        for col in range(len(cells)):
+            pivot = next((r for r in range(pivot_row, len(matrix)) if matrix[r][col] != 0), None)
+            if pivot is None:
+                continue
+            matrix[pivot_row], matrix[pivot] = matrix[pivot], matrix[pivot_row]
+            lead = matrix[pivot_row][col]
+            matrix[pivot_row] = [value / lead for value in matrix[pivot_row]]
+            for r in range(len(matrix)):
+                if r != pivot_row and matrix[r][col] != 0:
+                    factor = matrix[r][col]
+                    matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[pivot_row])]
+            pivot_row += 1
+            if pivot_row == len(matrix):
+                break
+
+        safe = set()
+        mines = set()
+        for row in matrix:
+            *coefficients, value = row
+            positive = sum(c for c in coefficients if c > 0)
+            negative = sum(c for c in coefficients if c < 0)
+            if value == positive:
+                upper, lower = mines, safe
+            elif value == negative:
+                upper, lower = safe, mines
+            else:
+                continue
+            for cell, coefficient in zip(cells, coefficients):
+                if coefficient > 0:
+                    upper.add(cell)
+                elif coefficient < 0:
+                    lower.add(cell)
+        return safe, mines
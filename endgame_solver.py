@@ -0,0 +1,141 @@
+import time
+from math import comb
+
+from search_clock import SearchClock
+
+
+class EndgameSolver:
+    """
+    Exhaustive solver for the last few unknown cells, using the total mine count.
+
+    Every frontier cell is a bit of an integer mask and every number a
+    (mask, mines) constraint. All frontier completions are enumerated with
+    backtracking, and each one is weighted by the number of ways to put the
+    remaining mines on the unconstrained cells. The AND and OR of the
+    completions give the forced mines and forced safe cells directly, and
+    the weighted counts give the exact mine probability of every cell.
+
+    The enumeration stops after time_budget seconds, and the board is left
+    to the probability solver.
+    """
+
+    def __init__(self, max_unknown=32, time_budget=0.25):
+        self.max_unknown = max_unknown
+        self.time_budget = time_budget
+
+    def applies(self, unknown_count, total_mines):
+        return total_mines is not None and 0 < unknown_count <= self.max_unknown
+
+    def collect(self, model):
+        """Returns (frontier cells, interior cells, constraints as (mask, mines), flag count) of a BoardModel."""
+        cell_constraints, unknown, flags = model.constraints()
+        bits = {}
+        constraints = []
+        for cells, mines in cell_constraints:
+            mask = 0
+            for cell in cells:
+                mask |= 1 << bits.setdefault(cell, len(bits))
+            constraints.append((mask, mines))
+
+        frontier = sorted(bits, key=bits.get)
+        interior = [cell for cell in unknown if cell not in bits]
+        return frontier, interior, constraints, flags
+
+    def completions(self, size, constraints, min_mines, max_mines, deadline=None):
+        """
+        Yield (mask, mines) for every frontier assignment that satisfies all
+        constraints and has between min_mines and max_mines mines. Raises
+        TimeoutError once the deadline has passed.
+        """
+        touching = [[] for _ in range(size)]
+        for index, (mask, _) in enumerate(constraints):
+            bit = mask
+            while bit:
+                low = bit & -bit
+                touching[low.bit_length() - 1].append(index)
+                bit ^= low
+
+        masks = [mask for mask, _ in constraints]
+        needed = [mines for _, mines in constraints]
+        placed = [0] * len(constraints)
+        remaining = [bin(mask).count('1') for mask in masks]
+        clock = SearchClock(deadline)
+
+        def backtrack(i, mask, mines):
+            if i == size:
+                yield mask, mines
+                return
+            if clock.expired():
+                raise TimeoutError
+            for value in (1, 0):
+                if value and mines >= max_mines:
+                    continue
+                if not value and mines + size - i - 1 < min_mines:
+                    continue
+                ok = True
+                for index in touching[i]:
+                    total = placed[index] + value
+                    if total > needed[index] or total + remaining[index] - 1 < needed[index]:
+                        ok = False
+                        break
+                if not ok:
+                    continue
+                for index in touching[i]:
+                    placed[index] += value
+                    remaining[index] -= 1
+                yield from backtrack(i + 1, mask | (value << i), mines + value)
+                for index in touching[i]:
+                    placed[index] -= value
+                    remaining[index] += 1
+
+        return backtrack(0, 0, 0)
+
+    def solve(self, model, total_mines):
+        """
+        Returns (probabilities, safe cells, mine cells), or None if the board
+        has too many unknown cells, no known mine count, no consistent
+        completion, or the time budget ran out.
+        """
+        frontier, interior, constraints, flags = self.collect(model)
+        if not self.applies(len(frontier) + len(interior), total_mines):
+            return None
+        mines_left = total_mines - flags
+        deadline = time.perf_counter() + self.time_budget if self.time_budget is not None else None
+
+        total = 0
+        any_mine = 0
+        all_mine = -1
+        weights = [0] * len(frontier)
+        interior_mines = 0
+        try:
+            for mask, mines in self.completions(len(frontier), constraints, mines_left - len(interior), mines_left,
+                                                deadline):
+                rest = mines_left - mines
+                weight = comb(len(interior), rest)
+                total += weight
+                any_mine |= mask
+                all_mine &= mask
+                interior_mines += weight * rest
+                bit = mask
+                while bit:
+                    low = bit & -bit
+                    weights[low.bit_length() - 1] += weight
+                    bit ^= low
+        except TimeoutError:
+            return None
+        if total == 0:
+            return None
+
+        probabilities = {cell: weight / total for cell, weight in zip(frontier, weights)}
+        if interior:
+            interior_probability = interior_mines / (total * len(interior))
+            for cell in interior:
+                probabilities[cell] = interior_probability
+
+        safe = [cell for i, cell in enumerate(frontier) if not any_mine >> i & 1]
+        mines = [cell for i, cell in enumerate(frontier) if all_mine >> i & 1]
+        if interior and interior_mines == 0:
+            safe.extend(interior)
+        elif interior and interior_mines == total * len(interior):
+            mines.extend(interior)
+        return probabilities, sorted(safe), sorted(mines)
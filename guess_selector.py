@@ -0,0 +1,136 @@
+import time
+
+
+class GuessSelector:
+    """
+    Picks the guess that best trades survival against expected progress.
+
+    The lowest-risk cells are the candidates. Each one gets a one-ply
+    lookahead: for every number the cell could show, the constraint solver is
+    re-run with that number added, and its total weight gives the chance of
+    the number. From this come the probability that the guess opens an area
+    (shows a 0) and the expected number of cells that become certain. The
+    score is survival * (1 + progress_weight * (P(opening) + expected forced cells)).
+
+    Candidates are evaluated from the lowest risk up until time_budget runs
+    out; a lookahead that cannot finish in time is dropped, so a move never
+    takes much longer than the budget. With time_budget None every candidate
+    is evaluated in full.
+    """
+
+    def __init__(self, analyzer, max_candidates=8, risk_tolerance=0.01, progress_weight=0.1, time_budget=0.05):
+        self.analyzer = analyzer
+        self.max_candidates = max_candidates
+        self.risk_tolerance = risk_tolerance
+        self.progress_weight = progress_weight
+        self.time_budget = time_budget
+        # Longest single outcome solve of the current select(); an outcome is
+        # only started if one that slow would still end before the deadline
+        self.slowest_outcome = 0.0
+
+    def candidates(self, probabilities):
+        """Cells close to the lowest risk; among equal risks, cells with fewer unknown neighbours open more often."""
+        lowest = min(probabilities.values())
+        unknown = self.analyzer.model.unknown
+        neighbours = self.analyzer.model.neighbours
+
+        def unknown_neighbours(cell):
+            return sum(1 for neighbour in neighbours[cell[0]][cell[1]] if unknown[neighbour])
+
+        close = [cell for cell, probability in probabilities.items() if probability <= lowest + self.risk_tolerance]
+        close.sort(key=lambda cell: (probabilities[cell], unknown_neighbours(cell), cell))
+        return close[:self.max_candidates]
+
+    def lookahead(self, cell, constraints, unknown, mines_left, probabilities, deadline):
+        """
+        Returns (probability of an opening, expected number of newly forced
+        cells) if the cell turns out safe, or None if no number is possible
+        or the deadline passes first.
+        """
+        outcomes = self.outcomes(cell, constraints, unknown, mines_left, probabilities, deadline)
+        if outcomes is None:
+            return None
+        total = sum(weight for _, weight, _ in outcomes)
+        if not total:
+            return None
+        opening = float(sum(weight for value, weight, _ in outcomes if value == 0) / total)
+        expected_forced = float(sum(weight * forced for _, weight, forced in outcomes) / total)
+        return opening, expected_forced
+
+    def outcomes(self, cell, constraints, unknown, mines_left, probabilities, deadline):
+        """
+        (number shown, weight, newly forced cells) of every possible number of
+        a safe cell, or None if the deadline passes first. The weights are
+        configuration counts, so they add up to the configurations in which
+        the cell is safe.
+        """
+        solver = self.analyzer.probability_solver
+        x, y = cell
+        grid = self.analyzer.grid
+        hidden = []
+        flags = 0
+        for adj_x, adj_y in self.analyzer.get_adjacent_cells(x, y):
+            if grid[adj_x][adj_y] is None:
+                hidden.append((adj_x, adj_y))
+            elif grid[adj_x][adj_y] == -1:
+                flags += 1
+
+        # The cell is revealed, so it leaves every constraint it was part of
+        base = [(tuple(c for c in cells if c != cell), mines) for cells, mines in constraints]
+        base = [(cells, mines) for cells, mines in base if cells]
+        rest = [c for c in unknown if c != cell]
+
+        outcomes = []
+        for mines in range(len(hidden) + 1):
+            start = time.perf_counter()
+            if deadline is not None and start + self.slowest_outcome > deadline:
+                return None
+            if hidden:
+                new_constraints = base + [(tuple(hidden), mines)]
+            else:
+                new_constraints = base
+            time_budget = None
+            if solver.time_budget is not None and deadline is not None:
+                # Share what is left of the move's budget between the remaining outcomes
+                time_budget = max(deadline - time.perf_counter(), 0) / (len(hidden) + 1 - mines)
+            new_probabilities, weight = solver.solve_constraints(new_constraints, rest, mines_left, time_budget,
+                                                                 clamp=False)
+            self.slowest_outcome = max(self.slowest_outcome, time.perf_counter() - start)
+            if weight:
+                forced = sum(1 for c, probability in new_probabilities.items()
+                             if (probability == 0 or probability == 1) and 0 < probabilities[c] < 1)
+                outcomes.append((mines + flags, weight, forced))
+            if not hidden:
+                break
+        return outcomes
+
+    def select(self):
+        """Returns the (x, y) cell to guess, or None if there is no unknown cell."""
+        probabilities = self.analyzer.get_mine_probabilities()
+        if not probabilities:
+            return None
+        candidates = self.candidates(probabilities)
+
+        solver = self.analyzer.probability_solver
+        constraints, unknown, flags = self.analyzer.model.constraints()
+        mines_left = solver.estimate_mines_left(self.analyzer.rows, self.analyzer.cols, flags)
+        if solver.total_mines is None:
+            # The estimate was clamped into the feasible range when the probabilities were solved. Every
+            # configuration then has exactly that many mines, so it is the sum of the probabilities. All
+            # outcomes use this one count, so their weights share the same binomial base.
+            mines_left = round(sum(probabilities.values()))
+
+        deadline = time.perf_counter() + self.time_budget if self.time_budget is not None else None
+        self.slowest_outcome = 0.0
+        best = candidates[0]
+        best_score = None
+        for cell in candidates:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            survival = 1 - probabilities[cell]
+            outcome = self.lookahead(cell, constraints, unknown, mines_left, probabilities, deadline)
+            progress = sum(outcome) if outcome is not None else 0
+            score = survival * (1 + self.progress_weight * progress)
+            if best_score is None or score > best_score:
+                best, best_score = cell, score
+        return best
@@ -0,0 +1,190 @@
+"""
+Timers, counters and histograms for the bot's hot paths.
+
+Everything is off until enable() is called. While disabled, timer() hands
+back a shared no-op context manager and count()/observe() return right
+away, so the calls can stay in the hot paths.
+
+    from instrumentation import instruments
+
+    instruments.enable()
+    with instruments.timer('capture'):
+        frame = grab()
+    instruments.count('cells_scanned', rows * cols)
+    instruments.dump('session.json')
+"""
+import cProfile
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Counts values in power-of-two buckets, so memory stays constant however long the session runs."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = {}  # exponent e -> number of values in [2 ** (e - 1), 2 ** e)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        exponent = math.frexp(value)[1] if value > 0 else None
+        self.buckets[exponent] = self.buckets.get(exponent, 0) + 1
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, capped at the largest value seen."""
+        if not self.count:
+            return 0.0
+        seen = 0
+        for exponent in sorted(self.buckets, key=lambda e: -math.inf if e is None else e):
+            seen += self.buckets[exponent]
+            if seen >= q * self.count:
+                return 0.0 if exponent is None else min(2.0 ** exponent, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'min': self.min or 0.0,
+            'max': self.max or 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+        }
+
+
+class Timer:
+    """Adds the milliseconds spent inside the with block to a histogram."""
+
+    def __init__(self, instruments, name):
+        self.instruments = instruments
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instruments.observe(self.name, 1000 * (time.perf_counter() - self.start))
+        return False
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Instrumentation:
+    """
+    Registry of counters and histograms. Timers record milliseconds into the
+    histogram of their name. Safe to use from the pipeline's threads.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def timer(self, name):
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def timed(self, name):
+        """Decorator form of timer(); checks enabled on every call, not when decorating."""
+        def decorate(function):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Timer(self, name):
+                    return function(*args, **kwargs)
+            wrapper.__name__ = function.__name__
+            wrapper.__doc__ = function.__doc__
+            return wrapper
+        return decorate
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def report(self):
+        with self.lock:
+            return {
+                'counters': dict(sorted(self.counters.items())),
+                'timings_ms': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+            }
+
+    def summary_text(self):
+        report = self.report()
+        lines = ["Timings (ms):", f"  {'name':<24}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"]
+        for name, s in report['timings_ms'].items():
+            lines.append(f"  {name:<24}{s['count']:>8}{s['mean']:>10.3f}{s['p50']:>10.3f}{s['p90']:>10.3f}"
+                         f"{s['p99']:>10.3f}{s['max']:>10.3f}")
+        lines.append("Counters:")
+        for name, value in report['counters'].items():
+            lines.append(f"  {name:<24}{value:>8}")
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        """Write the report to path, as JSON if it ends in .json and as text otherwise. Prints it if path is None."""
+        if path is None:
+            print(self.summary_text())
+            return
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(self.report(), f, indent=2)
+            else:
+                f.write(self.summary_text() + "\n")
+        print(f"Wrote instrumentation report to {path}")
+
+    @contextmanager
+    def profile(self, path):
+        """Run the with block under cProfile and save the stats to path (read them with pstats or snakeviz)."""
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            print(f"Wrote profile to {path}")
+
+
+# Shared by every module, so one enable() turns on the whole session
+instruments = Instrumentation()
@@ -0,0 +1,164 @@
+"""
+Lookup table of the deductions that follow from a single 3x3 neighbourhood.
+
+    python local_rules.py            # rebuild assets/local_rules.bin
+"""
+import os
+
+import numpy as np
+
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'local_rules.bin')
+MAGIC = b'LR33'
+
+# The 8 neighbours of the centre cell, in the bit order of the safe and mine masks
+OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ORTHOGONAL = (1, 3, 4, 6)
+CORNERS = (0, 2, 5, 7)
+
+# Neighbour states: unknown, blocked (no usable constraint), or a number with this residual.
+# Orthogonal neighbours see 4 cells of the window and corners only 2, so corners keep fewer residuals.
+UNKNOWN_STATE = 0
+BLOCKED_STATE = 1
+ORTHOGONAL_RESIDUALS = (1, 2, 3)
+CORNER_RESIDUALS = (1,)
+ORTHOGONAL_STATES = 2 + len(ORTHOGONAL_RESIDUALS)
+CORNER_STATES = 2 + len(CORNER_RESIDUALS)
+TABLE_SIZE = 9 * ORTHOGONAL_STATES ** 4 * CORNER_STATES ** 4
+
+
+def window_overlap(position):
+    """Neighbours of the window cell at position (an OFFSETS index) that lie in the window, without the centre."""
+    px, py = OFFSETS[position]
+    return [k for k, (qx, qy) in enumerate(OFFSETS) if k != position and abs(qx - px) <= 1 and abs(qy - py) <= 1]
+
+
+def encode(residual, orthogonal, corners):
+    """Table index of a centre residual and the states of the orthogonal and corner neighbours."""
+    index = residual
+    for state in orthogonal:
+        index = index * ORTHOGONAL_STATES + state
+    for state in corners:
+        index = index * CORNER_STATES + state
+    return index
+
+
+def build_table():
+    """
+    Solve every neighbourhood exhaustively. Entry = safe mask | mine mask << 8.
+
+    Every mine assignment of the unknown neighbours is checked against the
+    centre (exactly its residual) and against each neighbouring number (at
+    most its residual inside the window, since it may have more unknown
+    cells outside). Cells that are empty or mined in every consistent
+    assignment are forced.
+    """
+    table = np.zeros(TABLE_SIZE, dtype='<u2')
+    assignments = (np.arange(256)[:, None] >> np.arange(8)) & 1
+    mine_counts = assignments.sum(axis=1)
+    overlaps = [np.array(window_overlap(k)) for k in range(8)]
+
+    for orthogonal in np.ndindex(*(ORTHOGONAL_STATES,) * 4):
+        for corners in np.ndindex(*(CORNER_STATES,) * 4):
+            states = [0] * 8
+            for k, state in zip(ORTHOGONAL, orthogonal):
+                states[k] = state
+            for k, state in zip(CORNERS, corners):
+                states[k] = state
+
+            unknown_mask = sum(1 << k for k in range(8) if states[k] == UNKNOWN_STATE)
+            # Only mines on unknown cells, and no neighbouring number over its residual
+            valid = (np.arange(256) & ~unknown_mask) == 0
+            for k in range(8):
+                if states[k] >= 2:
+                    residuals = ORTHOGONAL_RESIDUALS if k in ORTHOGONAL else CORNER_RESIDUALS
+                    valid &= assignments[:, overlaps[k]].sum(axis=1) <= residuals[states[k] - 2]
+
+            for residual in range(9):
+                consistent = assignments[valid & (mine_counts == residual)]
+                if not len(consistent):
+                    continue
+                safe = ~consistent.any(axis=0) & (unknown_mask >> np.arange(8) & 1).astype(bool)
+                mines = consistent.all(axis=0)
+                table[encode(residual, orthogonal, corners)] = (safe @ (1 << np.arange(8))
+                                                               | (mines @ (1 << np.arange(8))) << 8)
+    return table
+
+
+def write_table(path=RULES_PATH):
+    table = build_table()
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint32(TABLE_SIZE).tobytes())
+        f.write(table.tobytes())
+    return table
+
+
+class LocalRules:
+    """
+    One-lookup local deductions around frontier numbers.
+
+    The table is memory-mapped from assets/local_rules.bin, so loading it
+    costs nothing up front and only the pages that are looked up are read.
+    """
+
+    def __init__(self, path=RULES_PATH):
+        self.table = np.memmap(path, dtype='<u2', mode='r', offset=len(MAGIC) + 4)
+        with open(path, 'rb') as f:
+            header = f.read(len(MAGIC) + 4)
+        if (header[:len(MAGIC)] != MAGIC or int(np.frombuffer(header[len(MAGIC):], dtype='<u4')[0]) != TABLE_SIZE
+                or len(self.table) != TABLE_SIZE):
+            raise ValueError(f"{path} is not a local rules table of this version")
+
+    def states(self, model, xs, ys):
+        """Neighbour states of the given cells, as a (cells, 8) array."""
+        rows, cols = model.rows, model.cols
+        states = np.full((len(xs), 8), BLOCKED_STATE, dtype=np.intp)
+        for k, (dx, dy) in enumerate(OFFSETS):
+            nx, ny = xs + dx, ys + dy
+            inside = (nx >= 0) & (nx < rows) & (ny >= 0) & (ny < cols)
+            nx, ny = nx[inside], ny[inside]
+            residual = model.residual[nx, ny]
+            residuals = ORTHOGONAL_RESIDUALS if k in ORTHOGONAL else CORNER_RESIDUALS
+            state = np.full(len(nx), BLOCKED_STATE, dtype=np.intp)
+            # Residuals above the ones in the table give no bound the table can use
+            for i, value in enumerate(residuals):
+                state[residual == value] = 2 + i
+            state[model.unknown[nx, ny]] = UNKNOWN_STATE
+            states[inside, k] = state
+        return states
+
+    def entries(self, model, cells):
+        """Table entries of the given cells; 0 (nothing forced) for cells that are not numbers."""
+        entries = np.zeros(len(cells), dtype=np.intp)
+        if not cells:
+            return entries
+        xs, ys = np.array(cells).T
+        residual = model.residual[xs, ys].astype(np.intp)
+        numbers = residual >= 0
+        xs, ys = xs[numbers], ys[numbers]
+        states = self.states(model, xs, ys)
+        index = residual[numbers]
+        for k in ORTHOGONAL:
+            index = index * ORTHOGONAL_STATES + states[:, k]
+        for k in CORNERS:
+            index = index * CORNER_STATES + states[:, k]
+        entries[numbers] = self.table[index]
+        return entries
+
+    @staticmethod
+    def decode(cell, entry):
+        """(safe cells, mine cells) of a table entry for the number at cell."""
+        x, y = cell
+        safe = [(x + dx, y + dy) for k, (dx, dy) in enumerate(OFFSETS) if entry >> k & 1]
+        mines = [(x + dx, y + dy) for k, (dx, dy) in enumerate(OFFSETS) if entry >> (k + 8) & 1]
+        return safe, mines
+
+
+def main():
+    table = write_table()
+    print(f"Wrote {RULES_PATH}: {TABLE_SIZE} entries, {np.count_nonzero(table)} with deductions")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,168 @@
+import random
+from collections import OrderedDict
+
+import numpy as np
+
+from board_model import BoardModel
+from constraint_reducer import ConstraintReducer
+from endgame_solver import EndgameSolver
+from guess_selector import GuessSelector
+from instrumentation import instruments
+from local_rules import LocalRules
 from pattern_analyzer import PatternAnalyzer
+from probability_solver import ComponentSolution, ProbabilitySolver
+
+
+# Deduction stages of the move ladder, in the order they are tried
+DEDUCTION_STAGES = ('local', 'pattern', 'basic', 'reduce', 'endgame')
+
+# The 8 rotations and reflections of the grid
+SYMMETRIES = (
+    lambda x, y: (x, y), lambda x, y: (x, -y), lambda x, y: (-x, y), lambda x, y: (-x, -y),
+    lambda x, y: (y, x), lambda x, y: (y, -x), lambda x, y: (-y, x), lambda x, y: (-y, -x),
+)
+
+
+def canonical_component(constraints):
+    """
+    Canonical form of a component's constraints, the same for every
+    translation, rotation and reflection of it. Returns (key, mapping) where
+    mapping takes every cell of the component to its canonical coordinates.
+    """
+    cells = {cell for component_cells, _ in constraints for cell in component_cells}
+    best = None
+    for symmetry in SYMMETRIES:
+        mapped = {cell: symmetry(*cell) for cell in cells}
+        min_x = min(x for x, _ in mapped.values())
+        min_y = min(y for _, y in mapped.values())
+        mapped = {cell: (x - min_x, y - min_y) for cell, (x, y) in mapped.items()}
+        key = tuple(sorted((tuple(sorted(mapped[cell] for cell in component_cells)), mines)
+                           for component_cells, mines in constraints))
+        if best is None or key < best[0]:
+            best = (key, mapped)
+    return best
+
+
+class ComponentCache:
+    """
+    LRU cache of solved frontier components, shared by every solve that uses it.
+
+    Components are keyed by their canonical form, so a component that comes
+    back unchanged after a click elsewhere, or appears again rotated, mirrored
+    or moved (in a later game too), is not enumerated again. Solutions are
+    stored in canonical coordinates and mapped back onto the actual cells.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, constraints):
+        """Cached solution of a component mapped onto its actual cells, or None."""
+        key, mapping = canonical_component(constraints)
+        cached = self.entries.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        cells = {canonical: cell for cell, canonical in mapping.items()}
+        solution = ComponentSolution([cells[canonical] for canonical in cached.cells])
+        solution.counts = cached.counts
+        solution.cell_counts = cached.cell_counts
+        return solution
+
+    def store(self, constraints, solution):
+        key, mapping = canonical_component(constraints)
+        cached = ComponentSolution([mapping[cell] for cell in solution.cells])
+        cached.counts = solution.counts
+        cached.cell_counts = solution.cell_counts
+        self.entries[key] = cached
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def solve(self, constraints, solve_component):
+        """Cached solution of a component, solving and storing it on a miss. None if the solve gave up."""
+        solution = self.lookup(constraints)
+        if solution is None:
+            solution = solve_component(constraints)
+            if solution is not None:
+                self.store(constraints, solution)
+        return solution
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
 
 class MinesweeperAnalyzer:
-    def __init__(self, grid, rows, cols):
-        self.grid = grid
+    def __init__(self, grid, rows, cols, component_cache=None, total_mines=None, endgame_unknown=32, time_budget=1.0,
+                 executor=None):
         self.rows = rows
         self.cols = cols
+        self.model = BoardModel(rows, cols)
+        self._deductions = None
+        self._deductions_version = None
+        self._satisfied = set()
+        self._full = set()
+        self._endgame = None
+        self._endgame_version = None
+        self._probabilities = None
+        self._probabilities_version = None
+        self._local_entries = {}
+        self._local_version = None
+        self.grid = grid
         self.pattern_analyzer = PatternAnalyzer(self)
+        self.constraint_reducer = ConstraintReducer(self)
+        # Pass a shared cache to reuse component solutions across analyzers and games
+        self.component_cache = component_cache if component_cache is not None else ComponentCache()
+        # Total number of mines on the board, if known; enables the exact endgame solver
+        self.total_mines = total_mines
+        # Wall-clock budget of a probability solve; larger frontier components are sampled.
+        # With a process pool executor, large components are solved on other cores.
+        self.probability_solver = ProbabilitySolver(total_mines, cache=self.component_cache, time_budget=time_budget,
+                                                    executor=executor)
+        # The endgame gets a quarter of the budget; if it runs out the probability solver takes over
+        self.endgame_solver = EndgameSolver(max_unknown=endgame_unknown,
+                                            time_budget=time_budget / 4 if time_budget is not None else None)
+        # Without a time budget the lookahead is unbounded too, so the same board always gives the same guess
+        self.guess_selector = GuessSelector(self) if time_budget is not None else GuessSelector(self, time_budget=None)
+        try:
+            self.local_rules = LocalRules()
+        except (OSError, ValueError) as e:
+            print(f"Local rules table not usable ({e}), run local_rules.py to rebuild it")
+            self.local_rules = None
+
+    @property
+    def grid(self):
+        return self._grid
 
+    @grid.setter
+    def grid(self, grid):
+        self._grid = grid
+        self.model.load(grid)
+
+    @instruments.timed('analyze.update')
     def update(self, grid):
         self.grid = grid
 
+    def mark_mine(self, x, y):
+        """Record a flag placed on the board without waiting for the next update."""
+        self._grid[x][y] = -1
+        self.model.set_flag(x, y)
+
     def print_board(self):
         for row in self.grid:
             for cell in row:
@@ -21,91 +174,209 @@ class MinesweeperAnalyzer:
 
     def get_adjacent_cells(self, x, y):
         """Returns all valid adjacent cells coordinates."""
-        adjacent = []
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                if dx == 0 and dy == 0:
-                    continue
-                new_x, new_y = x + dx, y + dy
-                if 0 <= new_x < self.rows and 0 <= new_y < self.cols:
-                    adjacent.append((new_x, new_y))
-        return adjacent
-
-    def count_adjacent_mines(self, x, y):
-        """Count known mines and unknown cells around a given cell."""
-        unknown = 0
-        mines = 0
-        for adj_x, adj_y in self.get_adjacent_cells(x, y):
-            if self.grid[adj_x][adj_y] is None:
-                unknown += 1
-            elif self.grid[adj_x][adj_y] == -1:  # We'll use -1 to mark known mines
-                mines += 1
-        return mines, unknown
+        return self.model.neighbours[x][y]
+
+    @instruments.timed('analyze.basic')
+    def find_basic_deductions(self):
+        """
+        Find safe moves, definite mines and chord moves.
+
+        The numbers whose remaining mines are all flagged (satisfied) or all
+        unknown (full) are kept between calls and only re-checked where the
+        board model reports a changed neighbourhood. The result is cached
+        until the board changes.
+        """
+        model = self.model
+        if self._deductions_version == model.version:
+            return self._deductions
+
+        touched = model.touched_since(self._deductions_version)
+        if touched is None:
+            self._satisfied = set()
+            self._full = set()
+            touched = model.frontier
+        for cell in touched:
+            residual = int(model.residual[cell])
+            # All mines accounted for: the remaining unknown cells are safe and the number can be chorded
+            if residual == 0 and cell in model.frontier:
+                self._satisfied.add(cell)
+            else:
+                self._satisfied.discard(cell)
+            # Remaining unknown cells must all be mines
+            if residual > 0 and residual == model.unknown_counts[cell]:
+                self._full.add(cell)
+            else:
+                self._full.discard(cell)
+
+        self._deductions = (
+            self.unknown_neighbours(self._satisfied),
+            self.unknown_neighbours(self._full),
+            sorted(self._satisfied),
+        )
+        self._deductions_version = model.version
+        return self._deductions
+
+    def unknown_neighbours(self, cells):
+        """Sorted unknown neighbours of the given cells."""
+        unknown = self.model.unknown
+        return sorted({neighbour for x, y in cells for neighbour in self.model.neighbours[x][y] if unknown[neighbour]})
+
+    @instruments.timed('analyze.local')
+    def find_local_moves(self):
+        """
+        Safe moves and mines forced inside the 3x3 neighbourhood of a single
+        number, with one table lookup per frontier number. Lookups are kept
+        between calls and only redone next to cells that changed.
+        """
+        model = self.model
+        if self.local_rules is None:
+            return [], []
+        if self._local_version != model.version:
+            touched = model.touched_since(self._local_version)
+            if touched is None:
+                self._local_entries = {}
+                nearby = model.frontier
+            else:
+                # A lookup reads the residuals and unknown cells right around its number
+                nearby = {neighbour for x, y in touched for neighbour in model.neighbours[x][y]} | set(touched)
+                for cell in nearby:
+                    self._local_entries.pop(cell, None)
+            anchors = [cell for cell in nearby if cell in model.frontier]
+            for cell, entry in zip(anchors, self.local_rules.entries(model, anchors).tolist()):
+                if entry:
+                    self._local_entries[cell] = entry
+            self._local_version = model.version
+
+        safe_moves = set()
+        mines = set()
+        for cell, entry in self._local_entries.items():
+            found_safe, found_mines = self.local_rules.decode(cell, entry)
+            safe_moves.update(found_safe)
+            mines.update(found_mines)
+        return sorted(safe_moves), sorted(mines)
 
     def find_safe_moves(self):
         """Find definitively safe moves based on number constraints."""
-        safe_moves = []
-        for x in range(self.rows):
-            for y in range(self.cols):
-                if self.grid[x][y] is not None and self.grid[x][y] > 0:  # If it's a number
-                    mines, unknown = self.count_adjacent_mines(x, y)
-                    # If all mines are accounted for, remaining unknown cells are safe
-                    if mines == self.grid[x][y]:
-                        for adj_x, adj_y in self.get_adjacent_cells(x, y):
-                            if self.grid[adj_x][adj_y] is None:
-                                safe_moves.append((adj_x, adj_y))
-        return list(set(safe_moves))  # Remove duplicates
+        return self.find_basic_deductions()[0]
 
     def find_definite_mines(self):
         """Find cells that must be mines based on number constraints."""
-        mines = []
-        for x in range(self.rows):
-            for y in range(self.cols):
-                if self.grid[x][y] is not None and self.grid[x][y] > 0:
-                    mines_found, unknown = self.count_adjacent_mines(x, y)
-                    # If remaining unknown cells must all be mines
-                    if unknown > 0 and self.grid[x][y] - mines_found == unknown:
-                        for adj_x, adj_y in self.get_adjacent_cells(x, y):
-                            if self.grid[adj_x][adj_y] is None:
-                                mines.append((adj_x, adj_y))
-        return list(set(mines))
-
-    def find_lowest_risk_move(self):
-        """Find the move with lowest probability of being a mine."""
-        min_risk = float('inf')
-        best_move = None
-
-        # Check each unknown cell
-        for x in range(self.rows):
-            for y in range(self.cols):
-                if self.grid[x][y] is None:
-                    max_risk = 0
-                    valid_constraint = False
-
-                    # Check all adjacent revealed numbers
-                    for adj_x, adj_y in self.get_adjacent_cells(x, y):
-                        if self.grid[adj_x][adj_y] is not None and self.grid[adj_x][adj_y] > 0:
-                            mines, unknown = self.count_adjacent_mines(adj_x, adj_y)
-                            if unknown > 0:
-                                valid_constraint = True
-                                risk = (self.grid[adj_x][adj_y] - mines) / unknown
-                                max_risk = max(max_risk, risk)
-
-                    if valid_constraint and max_risk < min_risk:
-                        min_risk = max_risk
-                        best_move = (x, y)
-
-        print("Risk of best move: ", min_risk)
+        return self.find_basic_deductions()[1]
+
+    @instruments.timed('analyze.reduce')
+    def find_reduced_moves(self):
+        """Find safe moves and mines forced by combining the constraints of neighbouring numbers."""
+        self.constraint_reducer.update()
+        return self.constraint_reducer.find_moves()
+
+    def solve_endgame(self):
+        """
+        Exhaustive solution of the board once few enough cells are unknown and
+        the mine count is known. Returns (probabilities, safe cells, mines) or None.
+        """
+        model = self.model
+        if self._endgame_version != model.version:
+            self._endgame = None
+            if self.endgame_solver.applies(int(model.unknown.sum()), self.total_mines):
+                self._endgame = self.endgame_solver.solve(self.model, self.total_mines)
+            self._endgame_version = model.version
+        return self._endgame
+
+    @instruments.timed('analyze.endgame')
+    def find_endgame_moves(self):
+        """Safe moves and mines forced by the mine count in the endgame."""
+        endgame = self.solve_endgame()
+        if endgame is None:
+            return [], []
+        return endgame[1], endgame[2]
+
+    def deduce(self, stage):
+        """(safe cells, mines) proven by one stage of DEDUCTION_STAGES."""
+        if stage == 'local':
+            return self.find_local_moves()
+        if stage == 'pattern':
+            return self.pattern_analyzer.analyze_patterns()
+        if stage == 'basic':
+            safe_moves, mines, _ = self.find_basic_deductions()
+            return safe_moves, mines
+        if stage == 'reduce':
+            return self.find_reduced_moves()
+        if stage == 'endgame':
+            return self.find_endgame_moves()
+        raise ValueError(f"Unknown deduction stage: {stage}")
+
+    def find_next_moves(self, timer=None):
+        """
+        The move ladder MinesweeperBot and the simulator play by. Stages run
+        in DEDUCTION_STAGES order and the first one that proves an unknown cell
+        safe or a mine decides; returns (stage, sorted safe cells, sorted mines),
+        or (None, [], []) when only a guess is left.
+
+        timer(stage, function), if given, is called to run each stage.
+        """
+        unknown = self.model.unknown
+        for stage in DEDUCTION_STAGES:
+            safe_moves, mines = timer(stage, lambda: self.deduce(stage)) if timer else self.deduce(stage)
+            safe_moves = sorted(cell for cell in safe_moves if unknown[cell])
+            mines = sorted(cell for cell in mines if unknown[cell])
+            if safe_moves or mines:
+                return stage, safe_moves, mines
+        return None, [], []
+
+    def find_all_moves(self):
+        """Every unknown cell any stage of the ladder proves safe or a mine, as sorted (safe cells, mines)."""
+        safe_moves = set()
+        mines = set()
+        for stage in DEDUCTION_STAGES:
+            found_safe, found_mines = self.deduce(stage)
+            safe_moves.update(found_safe)
+            mines.update(found_mines)
+        unknown = self.model.unknown
+        return sorted(cell for cell in safe_moves if unknown[cell]), sorted(cell for cell in mines if unknown[cell])
+
+    @instruments.timed('analyze.probabilities')
+    def get_mine_probabilities(self):
+        """Exact mine probability of every unknown cell, keyed by (x, y). Cached until the board changes."""
+        if self._probabilities_version != self.model.version:
+            endgame = self.solve_endgame()
+            if endgame is not None:
+                self._probabilities = endgame[0]
+            else:
+                self._probabilities = self.probability_solver.solve(self.model)
+            self._probabilities_version = self.model.version
+        return self._probabilities
+
+    @instruments.timed('analyze.guess')
+    def find_best_guess(self):
+        """Find the guess with the best mix of survival chance and expected progress."""
+        best_move = self.guess_selector.select()
+        if best_move is not None:
+            instruments.count('guesses')
+            print("Risk of best guess: ", self.get_mine_probabilities()[best_move])
         return best_move
 
+    def find_random_move(self, rng=random):
+        """
+        A random unknown cell, for when find_best_guess() has nothing because
+        the board read is inconsistent (a misread cell or a wrong flag). None
+        once no cell is unknown.
+        """
+        unknown = [(int(x), int(y)) for x, y in np.argwhere(self.model.unknown)]
+        return rng.choice(unknown) if unknown else None
+
     def find_chord_moves(self):
         """Find cells where we can perform a chord click."""
-        chord_moves = []
-        for x in range(self.rows):
-            for y in range(self.cols):
-                if self.grid[x][y] is not None and self.grid[x][y] > 0:  # If it's a number
-                    mines, unknown = self.count_adjacent_mines(x, y)
-                    # If the number matches exactly the number of adjacent flags
-                    if mines == self.grid[x][y] and unknown > 0:
-                        chord_moves.append((x, y))
-        return chord_moves
+        return self.find_basic_deductions()[2]
+
+    def find_chord_for(self, cell):
+        """
+        A satisfied number next to a safe cell, to chord on instead of
+        clicking the cell: the one with the most unknown neighbours, or None.
+        Whichever stage proved the cell safe, a chord opens it and the rest
+        of the number's unknown neighbours in one click.
+        """
+        chords = set(self.find_chord_moves())
+        candidates = [neighbour for neighbour in self.model.neighbours[cell[0]][cell[1]] if neighbour in chords]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda number: (int(self.model.unknown_counts[number]), number))
@@ -1,17 +1,21 @@
-import time
+import queue
+import threading
 
 import pyautogui
 from pynput import keyboard, mouse
 from pynput.keyboard import Key
 
+from board_overlay import BoardOverlay, HINT_COLOURS, heat_colour
 from board_processor import BoardProcessor
 from minesweeper_analyzer import MinesweeperAnalyzer
+from refresh_worker import RefreshWorker
+from tile_recognizer import create_classifier
 
 import tkinter as tk
 
 
 class MinesweeperAssistant:
-    def __init__(self):
+    def __init__(self, classifier='color'):
         self.running = True
 
         # Initialize the main window
@@ -19,13 +23,16 @@ class MinesweeperAssistant:
         self.root.withdraw()  # Hide window initially
 
         # Initialize components
-        self.board_processor = BoardProcessor()
+        # classifier is a name ('color', 'tiles') or anything with classify/classify_cells
+        if isinstance(classifier, str):
+            classifier = create_classifier(classifier)
+        self.board_processor = BoardProcessor(classifier=classifier)
         self.analyzer = None
 
         # State variables
         self.corner_count = 0
         self.is_initialized = False
-        self.hovered_rectangles = set()
+        self.heatmap = False  # Show the mine probability of every unknown cell instead of the certain hints
 
         # Create canvas (will be configured after corners are selected)
         self.canvas = tk.Canvas(self.root, bd=0, highlightthickness=1, bg='black')
@@ -36,10 +43,26 @@ class MinesweeperAssistant:
         self.root.wm_attributes("-topmost", 1)
         self.root.overrideredirect(True)  # Remove window decorations
 
-        # Storage for rectangles
-        self.mine_rectangles = []  # Store red rectangles (mines)
-        self.safe_rectangles = []  # Store green rectangles (safe moves)
-        self.chord_rectangles = []  # Store blue rectangles (chord moves)
+        # Hint rectangles, created once the board size is known
+        self.overlay = None
+
+        # Latest mouse position in window coordinates, handed from the mouse listener to the Tk thread.
+        # Only one hover update is queued at a time, however fast the mouse moves.
+        self.hover_lock = threading.Lock()
+        self.pointer = None
+        self.hover_pending = False
+
+        # Work for the Tk thread from the listeners and the refresh worker; only the Tk thread
+        # may touch the window, so it polls this queue instead of being called into
+        self.tk_tasks = queue.Queue()
+        self.tk_poll_ms = 15
+        self.root.after(self.tk_poll_ms, self.run_tk_tasks)
+
+        # Screen grabs and analysis run on the refresh worker, the listeners only signal it
+        self.board_lock = threading.Lock()
+        self.refresher = RefreshWorker(self.capture_board, self.analyze_board, self.publish_hints,
+                                       lambda: self.on_tk_thread(self.root.quit))
+        self.refresher.start()
 
         # Initialize input listeners
         self.keyboard_listener = keyboard.Listener(on_press=self.on_key_press)
@@ -52,6 +75,20 @@ class MinesweeperAssistant:
         self.keyboard_listener.start()
         self.mouse_listener.start()
 
+    def on_tk_thread(self, function, *args):
+        """Queue a call for the Tk thread. Safe from any thread."""
+        self.tk_tasks.put((function, args))
+
+    def run_tk_tasks(self):
+        """Runs on the Tk thread: everything queued so far, then polls again."""
+        while True:
+            try:
+                function, args = self.tk_tasks.get_nowait()
+            except queue.Empty:
+                break
+            function(*args)
+        self.root.after(self.tk_poll_ms, self.run_tk_tasks)
+
     def on_key_press(self, key):
         try:
             if key.char == '`' and not self.is_initialized:
@@ -65,20 +102,22 @@ class MinesweeperAssistant:
                     # Get second corner and initialize
                     x, y = pyautogui.position()
                     self.board_processor.corners.append((x, y))
+                    self.corner_count += 1
                     print("Bottom-right corner captured")
-                    self.initialize_window()
+                    self.on_tk_thread(self.initialize_window)
+            elif key.char == 'h' and self.is_initialized:
+                self.heatmap = not self.heatmap
+                print(f"Probability heatmap {'on' if self.heatmap else 'off'}")
+                self.refresher.request()
 
         except AttributeError:
             if key == Key.space:
                 print("Resetting the game")
-                for rect in self.mine_rectangles + self.safe_rectangles + self.chord_rectangles:
-                    self.canvas.delete(rect)
-                self.mine_rectangles = []
-                self.safe_rectangles = []
-                self.chord_rectangles = []
-                self.hovered_rectangles = set()
-                self.board_processor.flag_positions = []
+                with self.board_lock:
+                    self.board_processor.flag_positions = []
                 self.running = True
+                if self.is_initialized:
+                    self.refresher.request()
             pass
 
     def on_mouse_move(self, x, y):
@@ -89,43 +128,27 @@ class MinesweeperAssistant:
         window_x = x - self.board_processor.corners[0][0]
         window_y = y - self.board_processor.corners[0][1]
 
+        with self.hover_lock:
+            self.pointer = (window_x, window_y)
+            if self.hover_pending:
+                return
+            self.hover_pending = True
+        # The canvas and the overlay may only be touched from the Tk thread
+        self.on_tk_thread(self.update_hover)
+
+    def update_hover(self):
+        """Runs on the Tk thread with the latest mouse position."""
+        with self.hover_lock:
+            window_x, window_y = self.pointer
+            self.hover_pending = False
+
         # Check if mouse is within window bounds
         if not (0 <= window_x <= self.canvas.winfo_width() and
                 0 <= window_y <= self.canvas.winfo_height()):
-            self.on_mouse_leave()
+            self.overlay.leave()
             return
 
-        cell_size = self.board_processor.cell_size
-
-        # Hide/show rectangles based on mouse position
-        for rect in self.mine_rectangles + self.safe_rectangles + self.chord_rectangles:
-            coords = self.canvas.coords(rect)
-            if len(coords) != 4:
-                continue  # in case weird bugs happen
-
-            if coords[0] <= window_x <= coords[2] and coords[1] <= window_y <= coords[3]:
-                self.canvas.itemconfig(rect, fill='black')
-                self.hovered_rectangles.add(rect)
-            elif rect in self.hovered_rectangles:
-                # Restore original color based on rectangle type
-                if rect in self.mine_rectangles:
-                    self.canvas.itemconfig(rect, fill='red')
-                elif rect in self.safe_rectangles:
-                    self.canvas.itemconfig(rect, fill='green')
-                elif rect in self.chord_rectangles:
-                    self.canvas.itemconfig(rect, fill='blue')
-                self.hovered_rectangles.remove(rect)
-
-    def on_mouse_leave(self):
-        # Restore all hovered rectangles to their original colors
-        for rect in self.hovered_rectangles:
-            if rect in self.mine_rectangles:
-                self.canvas.itemconfig(rect, fill='red')
-            elif rect in self.safe_rectangles:
-                self.canvas.itemconfig(rect, fill='green')
-            elif rect in self.chord_rectangles:
-                self.canvas.itemconfig(rect, fill='blue')
-        self.hovered_rectangles.clear()
+        self.overlay.hover(window_x, window_y)
 
     def on_mouse_click(self, x, y, button, pressed):
         if not self.is_initialized:
@@ -135,35 +158,28 @@ class MinesweeperAssistant:
         window_x = x - self.board_processor.corners[0][0]
         window_y = y - self.board_processor.corners[0][1]
 
-        # Check if click is within window bounds
-        if not (0 <= window_x <= self.canvas.winfo_width() and
-                0 <= window_y <= self.canvas.winfo_height()):
+        # Plain arithmetic, so it is safe on the listener thread, unlike asking the canvas for its size
+        cell = self.overlay.cell_at(window_x, window_y)
+        if cell is None:
             return
-
-        cell_size = self.board_processor.cell_size
-        row = window_y // cell_size
-        col = window_x // cell_size
-
-
-        if pressed and button == mouse.Button.right and (self.board_processor.game_grid[row][col] is None or self.board_processor.game_grid[row][col] < 0):
-            # Toggle flag in board processor
-            flag_pos = (row, col)
-            if flag_pos in self.board_processor.flag_positions:
-                self.board_processor.flag_positions.remove(flag_pos)
-                print(f"Removed flag at {flag_pos}")
-            else:
-                self.board_processor.flag_positions.append(flag_pos)
-                print(f"Added flag at {flag_pos}")
-
-        # Update game state before processing the click
-        if not self.board_processor.update_game_board():
-            self.root.quit()  # Exit if game is over (bomb found)
-            return
-
-        if not pressed:
-            self.root.after(250, self.update_overlay)
+        row, col = cell
+
+        with self.board_lock:
+            cell = self.board_processor.game_grid[row][col]
+            if pressed and button == mouse.Button.right and (cell is None or cell < 0):
+                # Toggle flag in board processor
+                flag_pos = (row, col)
+                if flag_pos in self.board_processor.flag_positions:
+                    self.board_processor.flag_positions.remove(flag_pos)
+                    print(f"Removed flag at {flag_pos}")
+                else:
+                    self.board_processor.flag_positions.append(flag_pos)
+                    print(f"Added flag at {flag_pos}")
+
+        self.refresher.request()
 
     def initialize_window(self):
+        """Runs on the Tk thread once both corners are picked."""
         # Initialize board processor with corners
         self.board_processor.initialize_board()
 
@@ -180,6 +196,9 @@ class MinesweeperAssistant:
         self.canvas.configure(width=width, height=height)
         self.root.deiconify()
 
+        self.overlay = BoardOverlay(self.canvas, self.board_processor.rows, self.board_processor.columns,
+                                    self.board_processor.cell_size)
+
         # Initialize analyzer
         self.analyzer = MinesweeperAnalyzer(
             self.board_processor.game_grid,
@@ -189,68 +208,44 @@ class MinesweeperAssistant:
 
         self.is_initialized = True
 
-        # self.update_overlay()
-        self.root.after(250, self.update_overlay)
+        self.refresher.request()
 
-    def update_overlay(self):
-        # Clear existing rectangles
-        for rect in self.mine_rectangles + self.safe_rectangles + self.chord_rectangles:
-            self.canvas.delete(rect)
-        self.mine_rectangles.clear()
-        self.safe_rectangles.clear()
-        self.chord_rectangles.clear()
+    def capture_board(self):
+        """Runs on the refresh worker. A copy of the classified grid, or None if a mine was hit."""
+        with self.board_lock:
+            if not self.board_processor.update_game_board():
+                return None
+            return [row[:] for row in self.board_processor.game_grid]
 
-        # Update game state
+    def analyze_board(self, grid):
+        """Runs on the refresh worker."""
         if not self.running:
-            # clean the ui square lists
-            for rect in self.mine_rectangles + self.safe_rectangles + self.chord_rectangles:
-                self.canvas.delete(rect)
-            self.board_processor.flag_positions = []
-            self.mine_rectangles = []
-            self.safe_rectangles = []
-            self.chord_rectangles = []
-            self.hovered_rectangles = set()
-            self.running = False
-            return
-
-        self.board_processor.update_game_board()
-
-        self.analyzer.update(self.board_processor.game_grid)
-
-        cell_size = self.board_processor.cell_size
-
-        # Draw mines (red)
-        mines = self.analyzer.find_definite_mines()
-        for row, col in mines:
-            rect = self.canvas.create_rectangle(
-                col * cell_size, row * cell_size,
-                (col + 1) * cell_size, (row + 1) * cell_size,
-                fill='red', stipple='gray50'
-            )
-            self.mine_rectangles.append(rect)
-
-        # Draw safe moves (green)
-        safe_moves = self.analyzer.find_safe_moves()
-        for row, col in safe_moves:
-            rect = self.canvas.create_rectangle(
-                col * cell_size, row * cell_size,
-                (col + 1) * cell_size, (row + 1) * cell_size,
-                fill='green', stipple='gray50'
-            )
-            self.safe_rectangles.append(rect)
-
-        # Draw chord moves (blue)
-        chord_moves = self.analyzer.find_chord_moves()
-        for row, col in chord_moves:
-            rect = self.canvas.create_rectangle(
-                col * cell_size, row * cell_size,
-                (col + 1) * cell_size, (row + 1) * cell_size,
-                fill='blue', stipple='gray50'
-            )
-            self.chord_rectangles.append(rect)
+            return {}
+        self.analyzer.update(grid)
+        return self.find_hints()
+
+    def publish_hints(self, removed, changed):
+        # Canvas items may only be touched from the Tk thread
+        self.on_tk_thread(self.overlay.apply, removed, changed)
+
+    def find_hints(self):
+        """The fill of every cell that should be highlighted, keyed by (row, col)."""
+        hints = {}
+        if self.heatmap:
+            for cell, probability in self.analyzer.get_mine_probabilities().items():
+                hints[cell] = heat_colour(probability)
+        else:
+            for cell in self.analyzer.find_definite_mines():
+                hints[cell] = HINT_COLOURS['mine']
+            for cell in self.analyzer.find_safe_moves():
+                hints[cell] = HINT_COLOURS['safe']
+        for cell in self.analyzer.find_chord_moves():
+            hints[cell] = HINT_COLOURS['chord']
+        return hints
 
     def cleanup(self):
         # Stop listeners
+        self.refresher.stop()
         self.keyboard_listener.stop()
         self.mouse_listener.stop()
         self.root.quit()
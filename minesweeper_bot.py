@@ -1,141 +1,248 @@
 import time
+from concurrent.futures import ProcessPoolExecutor
 
 from pynput import keyboard, mouse
-import random
 
+from action_scheduler import ActionScheduler, HumanPacing
 from minesweeper_analyzer import MinesweeperAnalyzer
 from board_processor import BoardProcessor
+from bot_pipeline import BotPipeline
+from instrumentation import instruments
+from screen_capture import create_capture
+from tile_recognizer import create_classifier
 
 
 class MinesweeperBot:
 
-    def __init__(self, cell_size=52, replay_on_complete=False):
+    def __init__(self, cell_size=52, replay_on_complete=False, pacing=None, burst_mode=False, auto_calibrate=False,
+                 use_calibration_cache=True, capture='auto', classifier='color', pipelined=False, total_mines=None,
+                 solver_workers=0, instrument=False, stats_path=None, profile_path=None):
 
-        self.board_processor = BoardProcessor(cell_size)
+        # capture is a backend name ('pil', 'mss', 'auto') or a CaptureBackend instance
+        if isinstance(capture, str):
+            capture = create_capture(capture)
+        # classifier is a name ('color', 'tiles') or anything with classify/classify_cells
+        if isinstance(classifier, str):
+            classifier = create_classifier(classifier)
+        self.board_processor = BoardProcessor(cell_size, incremental=True, classifier=classifier, capture=capture)
         self.analyzer = None
 
+        # Delay policy applied after every action; burst and pipelined mode only wait for the screen to change
+        self.pacing = pacing if pacing is not None else HumanPacing()
+        self.burst_mode = burst_mode
+        # Capture, solve and click on separate threads, see bot_pipeline.py
+        self.pipelined = pipelined
+        self.scheduler = ActionScheduler(self, pacing=pacing)
+
         self.running = True
 
         self.cell_size = cell_size
+        # Total mine count of the game, if known; lets the analyzer solve endgames exactly
+        self.total_mines = total_mines
+        # Worker processes for solving large frontier components, kept for the whole session
+        self.solver_pool = ProcessPoolExecutor(max_workers=solver_workers) if solver_workers > 0 else None
 
         self.replay_on_complete = replay_on_complete
+        self.auto_calibrate = auto_calibrate
+        self.use_calibration_cache = use_calibration_cache
+
+        # Stage timings and counters, reported at the end of the session (stats_path: .json or text)
+        self.stats_path = stats_path
+        # Run the session under cProfile and save the stats here
+        self.profile_path = profile_path
+        if instrument or stats_path:
+            instruments.enable()
+
+        if auto_calibrate:
+            # The board is found on screen or in the cache, no corners to pick
+            self.init()
+            self.session()
+            return
 
         # Start listening to keyboard events
         with keyboard.Listener(on_release=self.on_release) as listener:
             listener.join()
 
+    def handle_game_over(self):
+        print("Game over!")
+        # press the space key on the keyboard
+        # keyboard.Controller().press(keyboard.Key.space)
+        time.sleep(1)
+
+        if self.replay_on_complete:
+            self.restart()
+        else:
+            self.running = False
+
+    def handle_game_complete(self):
+        print("Game complete!")
+        # press the space key on the keyboard
+        keyboard.Controller().press(keyboard.Key.space)
+        self.running = True
+        self.restart()
+
     def play(self):
+        if self.pipelined:
+            return self.play_pipelined()
+        if self.burst_mode:
+            return self.play_bursts()
+
         clickedBomb = False
         while self.running and not clickedBomb:
             # Update the current state of the board
             clickedBomb = self.update_state()
 
             if clickedBomb:
-                print("Game over!")
-                # press the space key on the keyboard
-                # keyboard.Controller().press(keyboard.Key.space)
-                time.sleep(1)
+                self.handle_game_over()
+                return  # Stop the game
 
-                if self.replay_on_complete:
-                    self.restart()
-                else:
-                    self.running = False
-                    return  # Stop the game
-
-            # Look for pattern-based moves first
-            pattern_safe_moves, pattern_mines = self.analyzer.pattern_analyzer.analyze_patterns()
-
-            # First handle any certain mines we found
-            for x, y in pattern_mines:
-                if self.board_processor.game_grid[x][y] is None:  # Only if not already flagged
-                    print(f"Flagging mine from pattern at ({x}, {y})")
-                    self.click_cell(y, x, flag=True)
-                    self.board_processor.game_grid[x][y] = -1
-                    time.sleep(0.5 + random.random())
-                    continue
-
-            # Then try pattern-based safe moves
-            if pattern_safe_moves:
-                x, y = pattern_safe_moves[0]
-                print(f"Making pattern-based safe move at ({x}, {y})")
-                self.click_cell(y, x)
-                time.sleep(0.5 + random.random())
-                continue
-
-
-            # Look for chord clicking opportunities
-            chord_moves = self.analyzer.find_chord_moves()
-            if chord_moves:
-                x, y = chord_moves[0]
-                print(f"Performing chord click at ({x}, {y})")
-                self.click_cell(y, x)
-                time.sleep(0.5 + random.random())
-                continue
-
-            # Find safe moves
-            safe_moves = self.analyzer.find_safe_moves()
+            # The first deduction stage that proves anything decides, see MinesweeperAnalyzer.find_next_moves
+            stage, safe_moves, mines = self.analyzer.find_next_moves()
+            for x, y in mines:
+                print(f"Flagging mine from {stage} deductions at ({x}, {y})")
+                instruments.count(f'deductions.{stage}')
+                self.click_cell(y, x, flag=True)
+                self.analyzer.mark_mine(x, y)
+                self.pacing.after_action()
             if safe_moves:
-                x, y = safe_moves[0]
-                print(f"Making safe move at ({x}, {y})")
+                # A chord on a satisfied number opens all of its unknown neighbours at once
+                chord = self.analyzer.find_chord_for(safe_moves[0])
+                if chord:
+                    x, y = chord
+                    print(f"Performing chord click at ({x}, {y})")
+                    instruments.count('deductions.chord')
+                else:
+                    x, y = safe_moves[0]
+                    print(f"Making {stage} safe move at ({x}, {y})")
+                    instruments.count(f'deductions.{stage}')
                 self.click_cell(y, x)  # Note: click_cell takes (col, row)
-                time.sleep(0.5 + random.random())
+                self.pacing.after_action()
+            if stage is not None:
                 continue
 
-            # Find definite mines and flag them
-            mines = self.analyzer.find_definite_mines()
-            for x, y in mines:
-                if self.board_processor.game_grid[x][y] != -1:  # Check if it's not already marked as a mine````
-                    print(f"Flagging mine at ({x}, {y})")
-                    self.click_cell(y, x, flag=True)  # Flag the cell
-                    self.board_processor.game_grid[x][y] = -1  # Mark as mine
-                    time.sleep(0.5 + random.random())
-
-
             # If no safe moves, make the lowest risk move
-            best_move = self.analyzer.find_lowest_risk_move()
+            best_move = self.analyzer.find_best_guess()
             if best_move:
                 x, y = best_move
                 print(f"Making probabilistic move at ({x}, {y})")
                 self.click_cell(y, x)  # Note: click_cell takes (col, row)
             else:
-                # If no moves available, try a random corner or edge cell
-                unclicked = [(i, j) for i in range(self.board_processor.rows) for j in range(self.board_processor.columns)
-                             if self.board_processor.game_grid[i][j] is None]
-                if unclicked:
-                    x, y = random.choice(unclicked)
+                # The board read is inconsistent, or there is nothing left to click
+                random_move = self.analyzer.find_random_move()
+                if random_move:
+                    x, y = random_move
                     print(f"Making random move at ({x}, {y})")
+                    instruments.count('guesses')
                     self.click_cell(y, x)
                 else:
-                    print("Game complete!")
-                    # press the space key on the keyboard
-                    keyboard.Controller().press(keyboard.Key.space)
-                    self.running = True
-                    self.restart()
-                    self.play()
+                    self.handle_game_complete()
                     break
 
-            time.sleep(0.5 + random.random())  # Add delay to avoid overwhelming the game
+            self.pacing.after_action()  # Add delay to avoid overwhelming the game
+
+    def session(self):
+        """Play, optionally under cProfile, then report the instrumentation."""
+        try:
+            if self.profile_path:
+                with instruments.profile(self.profile_path):
+                    self.play()
+            else:
+                self.play()
+        finally:
+            if self.solver_pool is not None:
+                self.solver_pool.shutdown(wait=False, cancel_futures=True)
+            print(f"Screen capture: {self.board_processor.capture.stats()}")
+            if instruments.enabled:
+                instruments.dump(self.stats_path)
+
+    def play_bursts(self):
+        """
+        Analyze once per burst: every currently known safe cell and mine is
+        acted on together, then the scheduler waits for the screen to catch up.
+        """
+        while self.running:
+            if self.update_state():
+                self.handle_game_over()
+                return
+
+            clicks, flags = self.find_burst_moves()
+            instruments.count('deductions.burst', len(clicks) + len(flags))
 
-    def init(self):
-        self.board_processor.initialize_board()
+            if not clicks and not flags:
+                best_move = self.analyzer.find_best_guess()
+                if best_move is None:
+                    # No consistent board was found (a misread cell or a wrong flag), not necessarily a finished game
+                    best_move = self.analyzer.find_random_move()
+                if best_move is None:
+                    self.handle_game_complete()
+                    return
+                print(f"Making probabilistic move at {best_move}")
+                clicks = [best_move]
+
+            print(f"Burst of {len(clicks)} clicks and {len(flags)} flags")
+            self.scheduler.run_burst(clicks, flags)
+
+    def find_burst_moves(self):
+        """Every safe cell and mine the analyzers can currently prove, as sorted (row, col) lists."""
+        # Chords only reveal cells that are already in the safe set, so plain clicks cover them
+        return self.analyzer.find_all_moves()
+
+    def play_pipelined(self):
+        # Paced like burst mode: not at all, unless a pacing was given
+        pipeline = BotPipeline(self, pacing=self.scheduler.pacing)
+        outcome = pipeline.run()
+        print(f"Pipeline stage times (ms): {pipeline.stats()}, capture: {self.board_processor.capture.stats()}")
+        if outcome == 'game_over':
+            self.handle_game_over()
+        elif outcome == 'complete':
+            self.handle_game_complete()
+
+    def calibrate(self):
+        if self.auto_calibrate:
+            if self.use_calibration_cache and self.board_processor.load_cached_calibration():
+                return
+            if not self.board_processor.auto_calibrate():
+                self.running = False
+                return
+        else:
+            self.board_processor.initialize_board()
+
+        if self.use_calibration_cache:
+            self.board_processor.save_calibration()
+
+    def init(self, calibrated=False):
+        # calibrated: the board was already located, e.g. from the calibration cache
+        if not calibrated:
+            self.calibrate()
+        if not self.running:
+            return
         self.board_processor.update_game_board()
 
-        self.analyzer = MinesweeperAnalyzer(self.board_processor.game_grid, self.board_processor.rows, self.board_processor.columns)
+        self.analyzer = MinesweeperAnalyzer(self.board_processor.game_grid, self.board_processor.rows, self.board_processor.columns,
+                                            total_mines=self.total_mines, executor=self.solver_pool)
 
     def update_state(self):
         clickedBomb = not self.board_processor.update_game_board()
-        self.analyzer.grid = self.board_processor.game_grid
+        self.analyzer.update(self.board_processor.game_grid)
         return clickedBomb
 
     def restart(self):
         self.running = True
         self.board_processor.cleanup()
-        self.board_processor.initialize_board()
-        self.board_processor.update_game_board()
-        self.play()
+        # Calibration can find a board of another size, so the analyzer is rebuilt with it
+        self.init()
+        if self.running:
+            self.play()
 
     def on_release(self, key):
         if key == keyboard.KeyCode.from_char('`'):  # Tilde key````````````
+            # The first press starts right away on a board from the calibration cache
+            if (not self.board_processor.corners and self.use_calibration_cache
+                    and self.board_processor.load_cached_calibration()):
+                self.init(calibrated=True)
+                self.session()
+                return False
+
             # Capture the mouse position when F2 is released
             x, y = mouse.Controller().position
             self.board_processor.corners.append((x, y))
@@ -143,15 +250,19 @@ class MinesweeperBot:
             # Check if we have selected 2 corners (top-left and bottom-right)
             if len(self.board_processor.corners) == 2:
                 self.init()
-                self.play()
+                self.session()
                 return False  # Stop listener after capturing corners
         elif key == keyboard.Key.esc:
             self.running = False
             return False
 
+    @instruments.timed('mouse.click')
     def click_cell(self, x, y, flag=False):
+        instruments.count('mouse.flags' if flag else 'mouse.clicks')
+        cell_size = self.board_processor.cell_size
         mouse.Controller().position = (
-        self.board_processor.corners[0][0] + x * self.cell_size + self.cell_size // 2, self.board_processor.corners[0][1] + y * self.cell_size + self.cell_size // 2)
+        self.board_processor.corners[0][0] + x * cell_size + cell_size // 2, self.board_processor.corners[0][1] + y * cell_size + cell_size // 2)
         mouse.Controller().click(mouse.Button.left if not flag else mouse.Button.right)
+        self.board_processor.mark_dirty(y, x)
         if flag:
             self.board_processor.flag_positions.append((y, x))
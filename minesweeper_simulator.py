@@ -0,0 +1,178 @@
+import random
+import time
+
+from minesweeper_analyzer import DEDUCTION_STAGES, MinesweeperAnalyzer
+
+
+class MinesweeperGame:
+    """
+    In-process Minesweeper board.
+
+    The player's view is kept in `grid` with the same contract the analyzers
+    read from the screen: None for unclicked cells, 0-8 for revealed cells and
+    -1 for flags. Mines are placed on the first reveal, away from the clicked cell.
+    """
+
+    def __init__(self, rows, cols, mines, seed=None, safe_opening=True):
+        self.rows = rows
+        self.cols = cols
+        self.mines = mines
+        self.safe_opening = safe_opening
+        self.rng = random.Random(seed)
+
+        self.grid = [[None for _ in range(cols)] for _ in range(rows)]
+        self.mine_positions = None
+        self.revealed = 0
+        self.lost = False
+
+    @property
+    def won(self):
+        return not self.lost and self.revealed == self.rows * self.cols - self.mines
+
+    @property
+    def finished(self):
+        return self.lost or self.won
+
+    def get_adjacent_cells(self, x, y):
+        return [(adj_x, adj_y)
+                for adj_x in range(max(x - 1, 0), min(x + 2, self.rows))
+                for adj_y in range(max(y - 1, 0), min(y + 2, self.cols))
+                if (adj_x, adj_y) != (x, y)]
+
+    def place_mines(self, x, y):
+        excluded = {(x, y)}
+        if self.safe_opening and self.rows * self.cols - 9 >= self.mines:
+            excluded.update(self.get_adjacent_cells(x, y))
+        candidates = [(i, j) for i in range(self.rows) for j in range(self.cols) if (i, j) not in excluded]
+        self.mine_positions = set(self.rng.sample(candidates, self.mines))
+
+    def count_mines(self, x, y):
+        return sum(1 for cell in self.get_adjacent_cells(x, y) if cell in self.mine_positions)
+
+    def click(self, x, y):
+        """Left click: reveal an unclicked cell, or chord on a revealed number."""
+        if self.finished:
+            return
+        if self.grid[x][y] is None:
+            self.reveal(x, y)
+        elif self.grid[x][y] > 0:
+            self.chord(x, y)
+
+    def reveal(self, x, y):
+        if self.mine_positions is None:
+            self.place_mines(x, y)
+        if (x, y) in self.mine_positions:
+            self.lost = True
+            return
+
+        # Flood fill from revealed zeros
+        stack = [(x, y)]
+        while stack:
+            cx, cy = stack.pop()
+            if self.grid[cx][cy] is not None:
+                continue
+            value = self.count_mines(cx, cy)
+            self.grid[cx][cy] = value
+            self.revealed += 1
+            if value == 0:
+                stack.extend(cell for cell in self.get_adjacent_cells(cx, cy) if self.grid[cell[0]][cell[1]] is None)
+
+    def chord(self, x, y):
+        """Reveal every unflagged neighbour of a number once it has as many flags around it."""
+        adjacent = self.get_adjacent_cells(x, y)
+        if sum(1 for i, j in adjacent if self.grid[i][j] == -1) != self.grid[x][y]:
+            return
+        for i, j in adjacent:
+            if self.grid[i][j] is None:
+                self.reveal(i, j)
+                if self.lost:
+                    return
+
+    def toggle_flag(self, x, y):
+        if self.finished:
+            return
+        if self.grid[x][y] is None:
+            self.grid[x][y] = -1
+        elif self.grid[x][y] == -1:
+            self.grid[x][y] = None
+
+
+# Decision stages timed by SimulatedBot, in the order they run
+STAGES = ('update',) + DEDUCTION_STAGES + ('risk',)
+
+
+class SimulatedBot:
+    """
+    Plays a MinesweeperGame with the same move ladder as MinesweeperBot.play,
+    without screen capture, mouse movement or sleeps.
+    """
+
+    def __init__(self, game, max_moves=None, component_cache=None, mine_count_known=True, time_budget=1.0):
+        self.game = game
+        # time_budget=None solves every move exactly, so a seeded game always plays out the same way
+        self.analyzer = MinesweeperAnalyzer(game.grid, game.rows, game.cols, component_cache=component_cache,
+                                            total_mines=game.mines if mine_count_known else None,
+                                            time_budget=time_budget)
+        self.max_moves = max_moves if max_moves is not None else game.rows * game.cols * 3
+
+        self.moves = 0
+        self.guesses = 0
+        self.chords = 0
+        self.stage_times = {stage: [] for stage in STAGES}
+
+    def timed(self, stage, function):
+        start = time.perf_counter()
+        result = function()
+        self.stage_times[stage].append(time.perf_counter() - start)
+        return result
+
+    def click(self, x, y):
+        self.game.click(x, y)
+        self.moves += 1
+
+    def flag(self, x, y):
+        if self.game.grid[x][y] is None:
+            self.game.toggle_flag(x, y)
+            self.analyzer.mark_mine(x, y)
+            self.moves += 1
+
+    def step(self):
+        """Make one decision against the current board."""
+        self.timed('update', lambda: self.analyzer.update(self.game.grid))
+
+        stage, safe_moves, mines = self.analyzer.find_next_moves(timer=self.timed)
+        for x, y in mines:
+            self.flag(x, y)
+        if safe_moves:
+            chord = self.analyzer.find_chord_for(safe_moves[0])
+            if chord:
+                self.chords += 1
+            self.click(*(chord or safe_moves[0]))
+        if stage is not None:
+            return
+
+        best_move = self.timed('risk', self.analyzer.guess_selector.select)
+        if best_move is None:
+            best_move = self.analyzer.find_random_move(self.game.rng)
+            if best_move is None:
+                return
+        self.guesses += 1
+        self.click(*best_move)
+
+    def play(self):
+        """Play until the game is won, lost or the move limit is reached. Returns a result dict."""
+        cache = self.analyzer.component_cache
+        hits, misses = cache.hits, cache.misses
+        for _ in range(self.max_moves):
+            if self.game.finished:
+                break
+            self.step()
+        return {
+            'won': self.game.won,
+            'moves': self.moves,
+            'guesses': self.guesses,
+            'chords': self.chords,
+            'stage_times': self.stage_times,
+            'cache_hits': cache.hits - hits,
+            'cache_misses': cache.misses - misses,
+        }
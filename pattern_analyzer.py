@@ -1,203 +1,179 @@
-class PatternAnalyzer:
-    def __init__(self, analyzer):
-        self.analyzer = analyzer
+from instrumentation import instruments
+
+
+# Pattern pictures, one string per row. Legend:
+#   1-8  revealed number whose reduced value (number minus adjacent flags) equals the digit
+#   #    not unknown: revealed, flagged or outside the board
+#   ?    anything
+#   m    unknown cell that must be a mine
+#   s    safe, if it is still unknown
+# Every pattern is compiled into all its rotations and reflections, and since
+# numbers are matched on their reduced value, 2-2 against a flag matches 1-1 and so on.
+PATTERNS = {
+    '1-1': (
+        "# # # s",
+        "# 1 1 s",
+        "# ? ? s",
+    ),
+    '1-2': (
+        "? # # #",
+        "? 1 2 #",
+        "? ? ? m",
+    ),
+    '1-2-1': (
+        "s # # # s",
+        "s 1 2 1 s",
+        "s m s m s",
+    ),
+    '1-2-2-1': (
+        "s # # # # s",
+        "s 1 2 2 1 s",
+        "s s m m s s",
+    ),
+}
+
+
+def compile_pattern(picture):
+    """
+    Compile a pattern picture into all its distinct rotations and reflections.
+
+    Each variant is returned as (anchor value, cells) where cells holds
+    (dx, dy, symbol) offsets relative to the first number of the variant.
+    """
+    grid = [row.split() for row in picture]
+    shapes = []
+    for _ in range(4):
+        grid = [list(row) for row in zip(*grid[::-1])]  # rotate 90 degrees
+        shapes.append(grid)
+        shapes.append([row[::-1] for row in grid])  # and its mirror image
+
+    variants = []
+    seen = set()
+    for shape in shapes:
+        key = tuple(tuple(row) for row in shape)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        cells = [(x, y, symbol) for x, row in enumerate(shape) for y, symbol in enumerate(row)]
+        anchor_x, anchor_y, anchor = next(cell for cell in cells if cell[2].isdigit())
+        variants.append((int(anchor), tuple((x - anchor_x, y - anchor_y, symbol)
+                                            for x, y, symbol in cells if symbol != '?')))
+    return variants
+
+
+def build_pattern_index(patterns):
+    """Index the compiled variants of every pattern by the reduced value of their anchor number."""
+    index = {}
+    for name, picture in patterns.items():
+        for anchor, cells in compile_pattern(picture):
+            index.setdefault(anchor, []).append((name, cells))
+    return index
 
-    def find_diagonal_pattern(self):
-        """
-        Find diagonal pattern like:
-        1 2
-        2 1
-        Where corners can be determined safe or mines.
-        """
-        safe_moves = []
-        mines = []
-
-        for x in range(self.analyzer.rows - 1):
-            for y in range(self.analyzer.cols - 1):
-                # Check if we have a 2x2 grid of numbers
-                values = [
-                    self.analyzer.grid[x][y],
-                    self.analyzer.grid[x][y + 1],
-                    self.analyzer.grid[x + 1][y],
-                    self.analyzer.grid[x + 1][y + 1]
-                ]
-
-                # Skip if any cell isn't a number
-                if any(v is None or v == -1 for v in values):
-                    continue
-
-                # Check for 1-2-2-1 diagonal pattern
-                if ((values[0] == 1 and values[3] == 1 and values[1] == 2 and values[2] == 2) or
-                        (values[1] == 1 and values[2] == 1 and values[0] == 2 and values[3] == 2)):
-
-                    # Count flags around each number to ensure we haven't already found mines
-                    flags = [0] * 4
-                    positions = [(x, y), (x, y + 1), (x + 1, y), (x + 1, y + 1)]
-
-                    for i, pos in enumerate(positions):
-                        for adj_x, adj_y in self.analyzer.get_adjacent_cells(*pos):
-                            if self.analyzer.grid[adj_x][adj_y] == -1:
-                                flags[i] += 1
-
-                    # Only proceed if pattern is still unsolved
-                    if all(f == 0 for f in flags):
-                        if values[0] == 1 and values[3] == 1:  # 1-2-2-1 pattern
-                            safe_moves.extend([(x, y + 1), (x + 1, y)])  # Corners are safe
-                            mines.extend([(x, y), (x + 1, y + 1)])  # Edges are mines
-                        else:  # 2-1-1-2 pattern
-                            safe_moves.extend([(x, y), (x + 1, y + 1)])  # Edges are safe
-                            mines.extend([(x, y + 1), (x + 1, y)])  # Corners are mines
-
-        return list(set(safe_moves)), list(set(mines))
-
-    def find_box_pattern(self):
-        """
-        Find 2x3 or 3x2 box patterns like:
-        2 3 2
-        2 3 2
-        Where middle edges must be mines
-        """
-        mines = []
-
-        # Check horizontal boxes (2x3)
-        for x in range(self.analyzer.rows - 1):
-            for y in range(self.analyzer.cols - 2):
-                values = [
-                    [self.analyzer.grid[x][y], self.analyzer.grid[x][y + 1], self.analyzer.grid[x][y + 2]],
-                    [self.analyzer.grid[x + 1][y], self.analyzer.grid[x + 1][y + 1], self.analyzer.grid[x + 1][y + 2]]
-                ]
-
-                # Check for 2-3-2 pattern in both rows
-                if all(v is not None and v != -1 for row in values for v in row):
-                    if (values[0] == [2, 3, 2] and values[1] == [2, 3, 2]):
-                        # Check that we haven't already found mines
-                        if not any(self.analyzer.grid[x - 1][y + 1] == -1 if x > 0 else False or
-                                                                                        self.analyzer.grid[x + 2][
-                                                                                            y + 1] == -1 if x < self.analyzer.rows - 2 else False):
-                            # Middle edges must be mines
-                            if x > 0:
-                                mines.append((x - 1, y + 1))
-                            if x < self.analyzer.rows - 2:
-                                mines.append((x + 2, y + 1))
-
-        # Check vertical boxes (3x2)
-        for x in range(self.analyzer.rows - 2):
-            for y in range(self.analyzer.cols - 1):
-                values = [
-                    [self.analyzer.grid[x][y], self.analyzer.grid[x][y + 1]],
-                    [self.analyzer.grid[x + 1][y], self.analyzer.grid[x + 1][y + 1]],
-                    [self.analyzer.grid[x + 2][y], self.analyzer.grid[x + 2][y + 1]]
-                ]
-
-                # Check for 2-3-2 pattern in both columns
-                if all(v is not None and v != -1 for row in values for v in row):
-                    if ([row[0] for row in values] == [2, 3, 2] and
-                            [row[1] for row in values] == [2, 3, 2]):
-                        # Check that we haven't already found mines
-                        if not any(self.analyzer.grid[x + 1][y - 1] == -1 if y > 0 else False or
-                                                                                        self.analyzer.grid[x + 1][
-                                                                                            y + 2] == -1 if y < self.analyzer.cols - 2 else False):
-                            # Middle edges must be mines
-                            if y > 0:
-                                mines.append((x + 1, y - 1))
-                            if y < self.analyzer.cols - 2:
-                                mines.append((x + 1, y + 2))
-
-        return list(set(mines))
-
-    def find_121_pattern(self):
-        """
-        Find 1-2-1 patterns like:
-        1 2 1
-        Where the cells adjacent to both 1s (diagonally touching the 2) must be mines.
-        Returns list of mine positions.
-        """
-        mines = []
-
-        # Check horizontal 1-2-1 patterns
-        for x in range(self.analyzer.rows):
-            for y in range(self.analyzer.cols - 2):
-                # Get the three consecutive cells
-                values = [
-                    self.analyzer.grid[x][y],
-                    self.analyzer.grid[x][y + 1],
-                    self.analyzer.grid[x][y + 2]
-                ]
-
-                # Check if we have a 1-2-1 pattern
-                if values == [1, 2, 1]:
-                    # Count existing flags around each number
-                    flags = [0] * 3
-                    for i, y_pos in enumerate(range(y, y + 3)):
-                        for adj_x, adj_y in self.analyzer.get_adjacent_cells(x, y_pos):
-                            if self.analyzer.grid[adj_x][adj_y] == -1:
-                                flags[i] += 1
-
-                    # If pattern is unsolved
-                    if all(f == 0 for f in flags):
-                        # Add mines diagonally adjacent to both 1s (touching the 2)
-                        if x > 0:  # Check cells above
-                            if self.analyzer.grid[x - 1][y] is None:
-                                mines.append((x - 1, y))  # Above left 1
-                            if self.analyzer.grid[x - 1][y + 2] is None:
-                                mines.append((x - 1, y + 2))  # Above right 1
-                        if x < self.analyzer.rows - 1:  # Check cells below
-                            if self.analyzer.grid[x + 1][y] is None:
-                                mines.append((x + 1, y))  # Below left 1
-                            if self.analyzer.grid[x + 1][y + 2] is None:
-                                mines.append((x + 1, y + 2))  # Below right 1
-
-        # Check vertical 1-2-1 patterns
-        for x in range(self.analyzer.rows - 2):
-            for y in range(self.analyzer.cols):
-                # Get the three consecutive cells
-                values = [
-                    self.analyzer.grid[x][y],
-                    self.analyzer.grid[x + 1][y],
-                    self.analyzer.grid[x + 2][y]
-                ]
-
-                # Check if we have a 1-2-1 pattern
-                if values == [1, 2, 1]:
-                    # Count existing flags around each number
-                    flags = [0] * 3
-                    for i, x_pos in enumerate(range(x, x + 3)):
-                        for adj_x, adj_y in self.analyzer.get_adjacent_cells(x_pos, y):
-                            if self.analyzer.grid[adj_x][adj_y] == -1:
-                                flags[i] += 1
-
-                    # If pattern is unsolved
-                    if all(f == 0 for f in flags):
-                        # Add mines diagonally adjacent to both 1s (touching the 2)
-                        if y > 0:  # Check cells to the left
-                            if self.analyzer.grid[x][y - 1] is None:
-                                mines.append((x, y - 1))  # Left of top 1
-                            if self.analyzer.grid[x + 2][y - 1] is None:
-                                mines.append((x + 2, y - 1))  # Left of bottom 1
-                        if y < self.analyzer.cols - 1:  # Check cells to the right
-                            if self.analyzer.grid[x][y + 1] is None:
-                                mines.append((x, y + 1))  # Right of top 1
-                            if self.analyzer.grid[x + 2][y + 1] is None:
-                                mines.append((x + 2, y + 1))  # Right of bottom 1
-
-        return list(set(mines))
 
+class PatternAnalyzer:
+    def __init__(self, analyzer, patterns=PATTERNS):
+        self.analyzer = analyzer
+        self.index = build_pattern_index(patterns)
+        # Furthest any pattern cell lies from its anchor
+        self.reach = max(max(abs(dx), abs(dy)) for variants in self.index.values()
+                         for name, cells in variants for dx, dy, symbol in cells)
+
+        # Deductions of every frontier anchor that matched, kept between calls
+        self.anchors = {}
+        self.version = None
+        self.result = ([], [])
+
+    def window(self, x, y):
+        """(top, left, reduced values, unknown flags) of the board around an anchor, as far as any pattern reaches."""
+        model = self.analyzer.model
+        top, left = max(x - self.reach, 0), max(y - self.reach, 0)
+        bottom, right = x + self.reach + 1, y + self.reach + 1
+        return (top, left, model.residual[top:bottom, left:right].tolist(),
+                model.unknown[top:bottom, left:right].tolist())
+
+    def match(self, cells, x, y, window, safe_moves, mines):
+        """Test one compiled pattern variant anchored at (x, y) and collect its deductions."""
+        rows, cols = self.analyzer.rows, self.analyzer.cols
+        top, left, reduced, unknown = window
+        found_safe = []
+        found_mines = []
+        for dx, dy, symbol in cells:
+            cx, cy = x + dx, y + dy
+            inside = 0 <= cx < rows and 0 <= cy < cols
+            wx, wy = cx - top, cy - left
+            if symbol == '#':
+                if inside and unknown[wx][wy]:
+                    return False
+            elif symbol == 'm':
+                if not inside or not unknown[wx][wy]:
+                    return False
+                found_mines.append((cx, cy))
+            elif symbol == 's':
+                if inside and unknown[wx][wy]:
+                    found_safe.append((cx, cy))
+            elif not inside or reduced[wx][wy] != int(symbol):
+                return False
+
+        safe_moves.extend(found_safe)
+        mines.extend(found_mines)
+        return True
+
+    @instruments.timed('analyze.pattern')
     def analyze_patterns(self):
-        """Analyze all advanced patterns and return combined results."""
-        all_safe_moves = []
-        all_mines = []
-
-        # Find diagonal patterns
-        safe_diagonal, mines_diagonal = self.find_diagonal_pattern()
-        all_safe_moves.extend(safe_diagonal)
-        all_mines.extend(mines_diagonal)
-
-        # Find box patterns
-        mines_box = self.find_box_pattern()
-        all_mines.extend(mines_box)
-
-        # Find 1-2-1 patterns
-        mines_121 = self.find_121_pattern()
-        all_mines.extend(mines_121)
+        """
+        Match every pattern around the frontier and return combined results.
 
-        return list(set(all_safe_moves)), list(set(all_mines))
\ No newline at end of file
+        Only windows anchored on a frontier number (a number with unknown
+        neighbours) are tested, and only against the variants whose anchor
+        has the same reduced value. The deductions of every anchor are kept
+        between calls, and only anchors within reach of a changed cell are
+        matched again.
+        """
+        model = self.analyzer.model
+        if self.version == model.version:
+            return self.result
+
+        touched = model.touched_since(self.version)
+        if touched is None:
+            self.anchors = {}
+            anchors = model.frontier
+        else:
+            anchors = self.anchors_near(touched)
+
+        matched = 0
+        for x, y in anchors:
+            self.anchors.pop((x, y), None)
+            if (x, y) not in model.frontier:
+                continue
+            variants = self.index.get(int(model.residual[x, y]), ())
+            if not variants:
+                continue
+            # Only the planes around the anchor are read, so a move costs as much as it changed
+            window = self.window(x, y)
+            safe_moves = []
+            mines = []
+            for name, cells in variants:
+                if self.match(cells, x, y, window, safe_moves, mines):
+                    matched += 1
+            if safe_moves or mines:
+                self.anchors[(x, y)] = (safe_moves, mines)
+
+        safe_moves = {cell for found, _ in self.anchors.values() for cell in found}
+        mines = {cell for _, found in self.anchors.values() for cell in found}
+        self.result = (list(safe_moves), list(mines))
+        self.version = model.version
+        instruments.count('pattern_anchors_scanned', len(anchors))
+        instruments.count('patterns_matched', matched)
+        return self.result
+
+    def anchors_near(self, cells):
+        """Cells close enough to one of the given cells for a pattern anchored there to see it."""
+        rows, cols = self.analyzer.rows, self.analyzer.cols
+        reach = self.reach
+        anchors = set()
+        for x, y in cells:
+            for anchor_x in range(max(x - reach, 0), min(x + reach + 1, rows)):
+                for anchor_y in range(max(y - reach, 0), min(y + reach + 1, cols)):
+                    anchors.add((anchor_x, anchor_y))
+        return anchors
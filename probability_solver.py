@@ -0,0 +1,526 @@
+import math
+import random
+import time
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from fractions import Fraction
+from math import comb
+
+from search_clock import SearchClock
+
+
+# Mine density assumed when the total mine count is not known
+DEFAULT_MINE_DENSITY = 0.2
+
+# How long past the deadline a worker process's result may take to arrive
+RESULT_SLACK = 0.02
+
+# Cells a batch of sampled particles advances between weight normalizations
+RESAMPLE_INTERVAL = 8
+
+
+def component_size(constraints):
+    """Number of distinct cells in a component."""
+    return len({cell for cells, _ in constraints for cell in cells})
+
+
+def scaled(value, log2_scale):
+    """value * 2 ** log2_scale, as a float while it fits in one and as a Fraction beyond that."""
+    whole = math.floor(log2_scale)
+    value *= 2 ** (log2_scale - whole)
+    if whole < 960:
+        return math.ldexp(value, whole)
+    return Fraction(value) * 2 ** whole
+
+
+def solve_component_task(constraints, time_budget, exact_limit, min_samples, exact_margin, sample_tolerance,
+                         particles):
+    """
+    Solve one component in a worker process. The constraints are plain
+    tuples and the ComponentSolution comes back pickled. time_budget is the
+    time left before the caller's deadline when the task was submitted.
+    """
+    solver = ProbabilitySolver(exact_limit=exact_limit, min_samples=min_samples, exact_margin=exact_margin,
+                               sample_tolerance=sample_tolerance, particles=particles)
+    if time_budget is None:
+        return solver.solve_component(constraints)
+    return solver.solve_within(constraints, time_budget)
+
+
+class ComponentSolution:
+    """Configuration counts of one independent frontier component, grouped by number of mines."""
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.counts = {}  # mines -> number of valid configurations
+        self.cell_counts = {}  # mines -> per-cell number of configurations with a mine there
+        # Number of random samples the counts were estimated from, 0 if they are exact.
+        # Estimated counts are floats in the same units as exact ones, or Fractions if too large for a float.
+        self.samples = 0
+
+    def add(self, assignment, mines):
+        if mines not in self.counts:
+            self.counts[mines] = 0
+            self.cell_counts[mines] = [0] * len(self.cells)
+        self.counts[mines] += 1
+        cell_counts = self.cell_counts[mines]
+        for i, value in enumerate(assignment):
+            if value:
+                cell_counts[i] += 1
+
+
+class ProbabilitySolver:
+    """
+    Exact per-cell mine probabilities for the current board.
+
+    The frontier is split into independent components of constrained cells,
+    every component is enumerated with backtracking, and the components are
+    combined with the unconstrained interior cells through binomial weighting
+    on the number of mines left. Component solutions can be memoized by
+    passing a cache (see minesweeper_analyzer.ComponentCache).
+
+    With a time_budget the solver is anytime: components with more than
+    exact_limit cells, or whose enumeration runs past the deadline, are
+    estimated by weighted random sampling of consistent configurations
+    instead, which takes at least min_samples and stops once the estimate
+    has converged or the time is up. Components up to exact_margin cells over
+    the limit first get most of their share of the budget to finish an exact
+    enumeration; larger ones go straight to sampling.
+
+    With an executor, large components are solved in worker processes while
+    the small ones are solved here, and the results are merged as usual.
+    """
+
+    def __init__(self, total_mines=None, cache=None, time_budget=None, exact_limit=48, min_samples=64, seed=None,
+                 executor=None, parallel_threshold=32, exact_margin=16, sample_tolerance=0.02,
+                 particles=32):
+        self.total_mines = total_mines
+        # Optional component cache with lookup(constraints), store(constraints, solution) and solve() methods
+        self.cache = cache
+        # Optional concurrent.futures process pool; components with at least
+        # parallel_threshold cells are solved there, smaller ones stay in-process
+        self.executor = executor
+        self.parallel_threshold = parallel_threshold
+        self.time_budget = time_budget
+        self.exact_limit = exact_limit
+        # Components up to exact_margin cells over the limit get most of their budget for enumeration
+        self.exact_margin = exact_margin
+        self.min_samples = min_samples
+        self.sample_tolerance = sample_tolerance
+        # Configurations sampled side by side in one sweep
+        self.particles = particles
+        self.rng = random.Random(seed)
+
+    def estimate_mines_left(self, rows, cols, flags):
+        total = self.total_mines
+        if total is None:
+            total = round(rows * cols * DEFAULT_MINE_DENSITY)
+        return total - flags
+
+    def split_components(self, constraints):
+        """Group constraints that share cells into independent components."""
+        parent = {}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for cells, _ in constraints:
+            for cell in cells:
+                parent.setdefault(cell, cell)
+            root = find(cells[0])
+            for cell in cells[1:]:
+                other = find(cell)
+                if other != root:
+                    parent[other] = root
+
+        components = {}
+        for cells, mines in constraints:
+            components.setdefault(find(cells[0]), []).append((cells, mines))
+        return list(components.values())
+
+    def order_cells(self, constraints):
+        """Order cells so that constraints get closed as early as possible during backtracking."""
+        cell_constraints = {}
+        for index, (cells, _) in enumerate(constraints):
+            for cell in cells:
+                cell_constraints.setdefault(cell, []).append(index)
+
+        order = []
+        seen = set()
+        for cells, _ in sorted(constraints, key=lambda constraint: len(constraint[0])):
+            queue = [cell for cell in cells if cell not in seen]
+            seen.update(queue)
+            while queue:
+                cell = queue.pop(0)
+                order.append(cell)
+                for index in cell_constraints[cell]:
+                    for neighbour in constraints[index][0]:
+                        if neighbour not in seen:
+                            seen.add(neighbour)
+                            queue.append(neighbour)
+        return order, cell_constraints
+
+    def solve_component(self, constraints, deadline=None):
+        """
+        Enumerate every valid mine configuration of one component.
+        Returns None if the deadline passes before the enumeration is done.
+        """
+        order, cell_constraints = self.order_cells(constraints)
+        solution = ComponentSolution(order)
+
+        values = [mines for _, mines in constraints]
+        assigned = [0] * len(constraints)
+        unassigned = [len(cells) for cells, _ in constraints]
+        links = [cell_constraints[cell] for cell in order]
+        assignment = [0] * len(order)
+        clock = SearchClock(deadline)
+
+        def backtrack(i, mines):
+            if i == len(order):
+                solution.add(assignment, mines)
+                return True
+            if clock.expired():
+                return False
+            for value in (0, 1):
+                ok = True
+                for index in links[i]:
+                    placed = assigned[index] + value
+                    if placed > values[index] or placed + unassigned[index] - 1 < values[index]:
+                        ok = False
+                        break
+                if not ok:
+                    continue
+                for index in links[i]:
+                    assigned[index] += value
+                    unassigned[index] -= 1
+                assignment[i] = value
+                finished = backtrack(i + 1, mines + value)
+                for index in links[i]:
+                    assigned[index] -= value
+                    unassigned[index] += 1
+                if not finished:
+                    return False
+            assignment[i] = 0
+            return True
+
+        if not backtrack(0, 0):
+            return None
+        return solution
+
+    def sample_component(self, constraints, deadline):
+        """
+        Estimate the configuration counts of a component by sequential Monte Carlo sampling.
+
+        A sweep walks a batch of particles, partial configurations, through
+        the cells in order and picks every open cell's value at random,
+        leaning towards the local mine density; values forced by a constraint
+        are propagated right away. Each particle is weighted by the inverse of
+        its probability, and one that runs into a contradiction gets weight 0.
+        Whenever a few particles carry most of the weight, the batch is
+        resampled in proportion to the weights, so on a long chain of
+        constraints the dead ends are dropped as they appear instead of
+        spoiling every sample. The product of the mean weights is an unbiased
+        estimate of the number of configurations. Sweeps stop at the deadline,
+        or earlier once that estimate's relative standard error is below
+        sample_tolerance, but take at least min_samples particles in all.
+        """
+        order, cell_constraints = self.order_cells(constraints)
+        index_of = {cell: i for i, cell in enumerate(order)}
+        members = [[index_of[cell] for cell in cells] for cells, _ in constraints]
+        values = [mines for _, mines in constraints]
+        sizes = [len(cells) for cells, _ in constraints]
+        links = [cell_constraints[cell] for cell in order]
+        rng = self.rng
+        particles = self.particles
+
+        def assign(assignment, assigned, unassigned, first, value):
+            """Assign a cell and everything it forces. Returns False on a contradiction."""
+            pending = [(first, value)]
+            while pending:
+                i, value = pending.pop()
+                if assignment[i] is not None:
+                    if assignment[i] != value:
+                        return False
+                    continue
+                assignment[i] = value
+                for index in links[i]:
+                    assigned[index] += value
+                    unassigned[index] -= 1
+                    left = values[index] - assigned[index]
+                    if left < 0 or left > unassigned[index]:
+                        return False
+                    if unassigned[index] and (left == 0 or left == unassigned[index]):
+                        forced = 1 if left else 0
+                        pending.extend((j, forced) for j in members[index] if assignment[j] is None)
+            return True
+
+        def sweep():
+            """
+            One batch of particles. Returns (log2 scale, totals, cell totals):
+            the weights are kept normalized to a mean of 1, and the scale is
+            what they were divided by.
+            """
+            batch = [([None] * len(order), [0] * len(constraints), list(sizes)) for _ in range(particles)]
+            weights = [1.0] * particles
+            scale = 0.0
+            for i in range(len(order)):
+                for k, (assignment, assigned, unassigned) in enumerate(batch):
+                    if not weights[k] or assignment[i] is not None:
+                        continue
+                    density = sum((values[index] - assigned[index]) / unassigned[index] for index in links[i])
+                    density = min(max(density / len(links[i]), 0.05), 0.95)
+                    value = 1 if rng.random() < density else 0
+                    weights[k] /= density if value else 1 - density
+                    if not assign(assignment, assigned, unassigned, i, value):
+                        weights[k] = 0.0
+
+                if i % RESAMPLE_INTERVAL == RESAMPLE_INTERVAL - 1 or i == len(order) - 1:
+                    mean = sum(weights) / particles
+                    if not mean:
+                        return scale, {}, {}
+                    scale += math.log2(mean)
+                    weights = [weight / mean for weight in weights]
+                    # Effective sample size under half the batch; the weights sum to the batch size
+                    if i < len(order) - 1 and sum(weight * weight for weight in weights) > 2 * particles:
+                        picks = rng.choices(range(particles), weights=weights, k=particles)
+                        batch = [tuple(list(state) for state in batch[k]) for k in picks]
+                        weights = [1.0] * particles
+
+            totals = {}
+            cell_totals = {}
+            for (assignment, _, _), weight in zip(batch, weights):
+                if not weight:
+                    continue
+                mines = sum(assignment)
+                totals[mines] = totals.get(mines, 0.0) + weight / particles
+                cell_weights = cell_totals.setdefault(mines, [0.0] * len(order))
+                for i, value in enumerate(assignment):
+                    if value:
+                        cell_weights[i] += weight / particles
+            return scale, totals, cell_totals
+
+        sweeps = []
+        samples = 0
+        while samples < self.min_samples or time.perf_counter() < deadline:
+            # Relative standard error of the sweeps' estimated numbers of configurations
+            found = [(scale, sum(totals.values())) for scale, totals, _ in sweeps if totals]
+            if samples >= self.min_samples and len(sweeps) > 1 and found:
+                top = max(scale for scale, _ in found)
+                estimates = [total * 2 ** (scale - top) for scale, total in found]
+                estimates += [0.0] * (len(sweeps) - len(found))
+                mean = sum(estimates) / len(sweeps)
+                variance = max(sum(estimate * estimate for estimate in estimates) / len(sweeps) - mean * mean, 0.0)
+                if (variance / len(sweeps)) ** 0.5 <= self.sample_tolerance * mean:
+                    break
+            samples += particles
+            sweeps.append(sweep())
+
+        # Average the sweeps on the scale of the largest one
+        solution = ComponentSolution(order)
+        solution.samples = samples
+        top = max((scale for scale, totals, _ in sweeps if totals), default=0.0)
+        counts = {}
+        cell_counts = {}
+        for scale, totals, cell_totals in sweeps:
+            factor = 2 ** (scale - top) / len(sweeps)
+            for mines, total in totals.items():
+                counts[mines] = counts.get(mines, 0.0) + total * factor
+                weights = cell_counts.setdefault(mines, [0.0] * len(order))
+                for i, weight in enumerate(cell_totals[mines]):
+                    weights[i] += weight * factor
+        for mines, count in counts.items():
+            solution.counts[mines] = scaled(count, top)
+            solution.cell_counts[mines] = [scaled(weight, top) for weight in cell_counts[mines]]
+        return solution
+
+    def exact_share(self, component):
+        """Share of a component's time budget that exact enumeration gets before sampling takes over."""
+        return 0.75 if component_size(component) <= self.exact_limit + self.exact_margin else 0.0
+
+    def solve_within(self, component, time_budget, exact_share=None):
+        """
+        Solve a component within a time budget. Tightly constrained components
+        often still enumerate quickly, so exact gets a share of the budget
+        first and sampling the rest. Components far over the exact limit are
+        only sampled.
+        """
+        if exact_share is None:
+            exact_share = self.exact_share(component)
+        start = time.perf_counter()
+        solution = None
+        if exact_share:
+            solution = self.solve_exact(component, start + time_budget * exact_share)
+        if solution is None:
+            solution = self.sample_component(component, start + time_budget)
+        return solution
+
+    def solve_exact(self, component, deadline):
+        """Exact solution of a component through the cache if there is one, or None if the deadline passed."""
+        if self.cache is not None:
+            return self.cache.solve(component, lambda constraints: self.solve_component(constraints, deadline))
+        return self.solve_component(component, deadline)
+
+    @staticmethod
+    def exact_counts(solution):
+        """Copy of a sampled solution with its float counts as Fractions."""
+        if not solution.samples:
+            return solution
+        exact = ComponentSolution(solution.cells)
+        exact.samples = solution.samples
+        exact.counts = {mines: Fraction(count) for mines, count in solution.counts.items()}
+        exact.cell_counts = {mines: [Fraction(count) for count in cell_counts]
+                             for mines, cell_counts in solution.cell_counts.items()}
+        return exact
+
+    def combine(self, solutions, interior, mines_left):
+        """
+        Weight the component solutions with the number of ways to place the
+        remaining mines in the interior. Returns (probabilities, total weight).
+        The total is in configurations, exact or estimated, so totals of
+        different calls can be compared.
+        """
+        # A component without a single valid configuration makes the whole board inconsistent
+        if not all(solution.counts for solution in solutions):
+            return None, 0
+        if any(solution.samples for solution in solutions):
+            # Binomials of a large interior do not fit in a float, so estimated counts are made exact fractions
+            solutions = [self.exact_counts(solution) for solution in solutions]
+
+        # Distribution of the total frontier mine count, with prefix/suffix products
+        # so each component can be combined with the distribution of all the others
+        def convolve(a, b):
+            result = {}
+            for mines_a, ways_a in a.items():
+                for mines_b, ways_b in b.items():
+                    result[mines_a + mines_b] = result.get(mines_a + mines_b, 0) + ways_a * ways_b
+            return result
+
+        prefix = [{0: 1}]
+        for solution in solutions:
+            prefix.append(convolve(prefix[-1], solution.counts))
+        suffix = [{0: 1}]
+        for solution in reversed(solutions):
+            suffix.append(convolve(suffix[-1], solution.counts))
+        suffix.reverse()
+
+        def interior_ways(mines):
+            if mines < 0 or mines > interior:
+                return 0
+            return comb(interior, mines)
+
+        total = sum(ways * interior_ways(mines_left - mines) for mines, ways in prefix[-1].items())
+        if total == 0:
+            return None, 0
+
+        probabilities = {}
+        for i, solution in enumerate(solutions):
+            others = convolve(prefix[i], suffix[i + 1])
+            weighted = [0] * len(solution.cells)
+            for mines, cell_counts in solution.cell_counts.items():
+                factor = sum(ways * interior_ways(mines_left - mines - other)
+                             for other, ways in others.items())
+                if factor:
+                    for j, count in enumerate(cell_counts):
+                        weighted[j] += count * factor
+            for cell, weight in zip(solution.cells, weighted):
+                probabilities[cell] = float(weight / total)
+
+        if interior:
+            interior_mines = sum(ways * interior_ways(mines_left - mines) * (mines_left - mines)
+                                 for mines, ways in prefix[-1].items())
+            probabilities[None] = float(interior_mines / (total * interior))
+
+        return probabilities, total
+
+    def solve_constraints(self, constraints, unknown, mines_left, time_budget=None, clamp=True):
+        """
+        Mine probability of every unknown cell under the given constraints.
+        Returns (probabilities, total weight); the weight is 0 if the constraints are inconsistent.
+        time_budget overrides the solver's own budget for this call. With
+        clamp=False an estimated mines_left is used as given, so the weights
+        of calls that share it are comparable.
+        """
+        if time_budget is None:
+            time_budget = self.time_budget
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        components = self.split_components(constraints)
+
+        # Hand the large components to the process pool first, so they run while the rest is solved here
+        solutions = []
+        remote = []
+        if self.executor is not None:
+            local = []
+            for component in components:
+                if component_size(component) < self.parallel_threshold:
+                    local.append(component)
+                    continue
+                solution = self.cache.lookup(component) if self.cache is not None else None
+                if solution is not None:
+                    solutions.append(solution)
+                    continue
+                remaining = max(deadline - time.perf_counter(), 0) if deadline is not None else None
+                try:
+                    remote.append((component, self.executor.submit(
+                        solve_component_task, component, remaining, self.exact_limit, self.min_samples,
+                        self.exact_margin, self.sample_tolerance, self.particles)))
+                except BrokenProcessPool:
+                    # A worker died earlier and the pool takes no more work; solve it here instead
+                    local.append(component)
+            components = local
+
+        # Exact components first, smallest first, so sampling gets the time that is left
+        components.sort(key=len)
+        large = []
+        for component in components:
+            solution = None
+            if deadline is None or component_size(component) <= self.exact_limit:
+                solution = self.solve_exact(component, deadline)
+            if solution is None:
+                large.append(component)
+            else:
+                solutions.append(solution)
+        for i, component in enumerate(large):
+            # Split the remaining time evenly between the large components
+            share = max(deadline - time.perf_counter(), 0) / (len(large) - i)
+            solutions.append(self.solve_within(component, share))
+
+        for component, future in remote:
+            try:
+                timeout = max(deadline - time.perf_counter(), 0) + RESULT_SLACK if deadline is not None else None
+                solution = future.result(timeout=timeout)
+            except (FutureTimeoutError, CancelledError, BrokenProcessPool):
+                # The pool is busy, slow to start or lost its worker; a quick estimate here beats waiting for it
+                future.cancel()
+                solution = self.sample_component(component, time.perf_counter())
+            if self.cache is not None and not solution.samples:
+                self.cache.store(component, solution)
+            solutions.append(solution)
+
+        frontier = {cell for solution in solutions for cell in solution.cells}
+        interior = len(unknown) - len(frontier)
+
+        # Keep the count feasible if it is only an estimate or the board has a misplaced flag
+        low = sum(min(solution.counts, default=0) for solution in solutions)
+        high = sum(max(solution.counts, default=0) for solution in solutions) + interior
+        if self.total_mines is None and clamp:
+            mines_left = min(max(mines_left, low), high)
+
+        probabilities, total = self.combine(solutions, interior, mines_left)
+        if probabilities is None:
+            return {}, 0
+
+        interior_probability = probabilities.pop(None, 0)
+        for cell in unknown:
+            if cell not in probabilities:
+                probabilities[cell] = interior_probability
+        return probabilities, total
+
+    def solve(self, model):
+        """Returns a dict mapping every unknown (x, y) cell of a BoardModel to its mine probability."""
+        constraints, unknown, flags = model.constraints()
+        mines_left = self.estimate_mines_left(model.rows, model.cols, flags)
+        probabilities, _ = self.solve_constraints(constraints, unknown, mines_left)
+        return probabilities
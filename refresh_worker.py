@@ -0,0 +1,101 @@
+import threading
+import time
+
+from board_overlay import diff_hints
+
+
+class RefreshWorker:
+    """
+    Background board refresh for the assistant.
+
+    Input listeners only call request(). The worker waits until no request
+    has come in for settle_time, so a burst of clicks costs one capture, then
+    captures until two consecutive frames agree (the board stopped
+    animating, at most max_settle seconds). Capture and analysis run on this
+    thread. Only the difference from the hints it last published is handed
+    to publish(removed, changed), which has to marshal it onto the Tk loop.
+
+    capture() returns a copy of the classified grid, or None once the game is
+    over (then game_over() is called and the worker stops). analyze(grid)
+    returns the {(row, col): fill} hints for that grid.
+    """
+
+    def __init__(self, capture, analyze, publish, game_over, settle_time=0.15, max_settle=1.0,
+                 poll_interval=0.03):
+        self.capture = capture
+        self.analyze = analyze
+        self.publish = publish
+        self.game_over = game_over
+        self.settle_time = settle_time
+        self.max_settle = max_settle
+        self.poll_interval = poll_interval
+
+        self.wake = threading.Condition()
+        self.requests = 0
+        self.last_request_at = 0.0
+        self.stopped = False
+        self.published = {}
+
+        self.refreshes = 0
+        self.captures = 0
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        with self.wake:
+            self.stopped = True
+            self.wake.notify()
+
+    def request(self):
+        """Ask for a refresh. Cheap and safe to call from any thread."""
+        with self.wake:
+            self.requests += 1
+            self.last_request_at = time.perf_counter()
+            self.wake.notify()
+
+    def wait_for_requests(self):
+        """Block until there are requests and they have been quiet for settle_time. Returns False once stopped."""
+        with self.wake:
+            while not self.stopped and not self.requests:
+                self.wake.wait()
+            while not self.stopped:
+                quiet = time.perf_counter() - self.last_request_at
+                if quiet >= self.settle_time:
+                    break
+                self.wake.wait(self.settle_time - quiet)
+            self.requests = 0
+            return not self.stopped
+
+    def settled_grid(self):
+        """Capture until the board looks the same twice in a row. None if the game is over."""
+        grid = self.capture()
+        self.captures += 1
+        deadline = time.perf_counter() + self.max_settle
+        while grid is not None and time.perf_counter() < deadline:
+            time.sleep(self.poll_interval)
+            again = self.capture()
+            self.captures += 1
+            if again == grid:
+                break
+            grid = again
+        return grid
+
+    def run(self):
+        while self.wait_for_requests():
+            grid = self.settled_grid()
+            if grid is None:
+                self.game_over()
+                return
+
+            hints = self.analyze(grid)
+            removed, changed = diff_hints(self.published, hints)
+            self.published = hints
+            self.refreshes += 1
+            if removed or changed:
+                self.publish(removed, changed)
+
+    def stats(self):
+        return {'refreshes': self.refreshes, 'captures': self.captures}
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageGrab
+
+try:
+    import mss
+except ImportError:  # optional, only needed for MssCapture
+    mss = None
+
+
+class CaptureBackend:
+    """
+    Grabs screen rectangles into reusable NumPy buffers.
+
+    grab() returns an (h, w, 3) uint8 RGB array that is owned by the backend
+    and overwritten by the next grab of the same size and slot on the same
+    thread, so frames cost no allocation once the buffer exists. Copy the
+    array if it has to outlive the next grab. bbox is (left, top, right,
+    bottom) in screen pixels, or None for the whole screen.
+    """
+
+    def __init__(self, max_buffers=8):
+        self.max_buffers = max_buffers
+        # Buffers are per thread, so another thread's grab never overwrites a frame
+        self.local = threading.local()
+
+        self.grab_count = 0
+        self.grab_seconds = 0.0
+
+    def buffer(self, height, width, slot=0):
+        if not hasattr(self.local, 'buffers'):
+            self.local.buffers = OrderedDict()
+        buffers = self.local.buffers
+        key = (height, width, slot)
+        if key in buffers:
+            buffers.move_to_end(key)
+        else:
+            buffers[key] = np.empty((height, width, 3), dtype=np.uint8)
+            if len(buffers) > self.max_buffers:
+                buffers.popitem(last=False)
+        return buffers[key]
+
+    def grab(self, bbox=None, slot=0):
+        start = time.perf_counter()
+        frame = self.grab_into(bbox, slot)
+        self.grab_seconds += time.perf_counter() - start
+        self.grab_count += 1
+        return frame
+
+    def grab_regions(self, rects):
+        """Grab only the given sub-rectangles. Each region gets its own buffer, even when sizes repeat."""
+        return [self.grab(rect, slot=('region', i)) for i, rect in enumerate(rects)]
+
+    def grab_into(self, bbox, slot=0):
+        raise NotImplementedError
+
+    def screen_size(self):
+        """(width, height) of the whole screen in pixels."""
+        frame = self.grab()
+        return frame.shape[1], frame.shape[0]
+
+    def stats(self):
+        return {
+            'grabs': self.grab_count,
+            'total_seconds': self.grab_seconds,
+            'mean_ms': 1000 * self.grab_seconds / self.grab_count if self.grab_count else 0.0,
+        }
+
+
+class PilCapture(CaptureBackend):
+    """Captures with PIL's ImageGrab. PIL allocates an image per grab, the frame buffer is still reused."""
+
+    def grab_into(self, bbox, slot=0):
+        image = np.asarray(ImageGrab.grab(bbox))
+        out = self.buffer(image.shape[0], image.shape[1], slot)
+        np.copyto(out, image[..., :3])
+        return out
+
+    def screen_size(self):
+        # Asks the OS instead of grabbing the whole screen; pyautogui needs a display as soon as it is imported
+        import pyautogui
+        width, height = pyautogui.size()
+        return width, height
+
+
+class MssCapture(CaptureBackend):
+    """
+    Captures through the mss shared-memory grabber, which reads the screen
+    without creating a PIL image. The BGRA shot is converted straight into the
+    reused RGB buffer.
+    """
+
+    def __init__(self, max_buffers=8):
+        if mss is None:
+            raise RuntimeError("MssCapture needs the 'mss' package")
+        super().__init__(max_buffers)
+
+    @property
+    def sct(self):
+        # mss handles cannot be shared between threads
+        if not hasattr(self.local, 'sct'):
+            self.local.sct = mss.mss()
+        return self.local.sct
+
+    def screen_size(self):
+        monitor = self.sct.monitors[1]
+        return monitor['width'], monitor['height']
+
+    def grab_into(self, bbox, slot=0):
+        if bbox is None:
+            monitor = self.sct.monitors[1]
+        else:
+            left, top, right, bottom = bbox
+            monitor = {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+        shot = self.sct.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        out = self.buffer(shot.height, shot.width, slot)
+        out[..., 0] = bgra[..., 2]
+        out[..., 1] = bgra[..., 1]
+        out[..., 2] = bgra[..., 0]
+        return out
+
+
+class ArrayCapture(CaptureBackend):
+    """Serves grabs from an in-memory screen array or an image file, for tests and offline runs."""
+
+    def __init__(self, screen, max_buffers=8):
+        super().__init__(max_buffers)
+        self.set_screen(screen)
+
+    def set_screen(self, screen):
+        if isinstance(screen, str):
+            screen = np.asarray(Image.open(screen).convert('RGB'))
+        self.screen = np.ascontiguousarray(screen[..., :3], dtype=np.uint8)
+
+    def screen_size(self):
+        return self.screen.shape[1], self.screen.shape[0]
+
+    def grab_into(self, bbox, slot=0):
+        if bbox is None:
+            bbox = (0, 0, self.screen.shape[1], self.screen.shape[0])
+        left, top, right, bottom = bbox
+        out = self.buffer(bottom - top, right - left, slot)
+        np.copyto(out, self.screen[top:bottom, left:right])
+        return out
+
+
+def create_capture(name='auto'):
+    """Capture backend by name: 'pil', 'mss', or 'auto' for mss when it is installed."""
+    if name == 'mss' or (name == 'auto' and mss is not None):
+        return MssCapture()
+    return PilCapture()
@@ -0,0 +1,20 @@
+import time
+
+
+class SearchClock:
+    """
+    Deadline check for backtracking searches. Reading the clock on every node
+    would cost more than the search, so it is only read every `interval` calls.
+    A deadline of None never expires.
+    """
+
+    def __init__(self, deadline, interval=1024):
+        self.deadline = deadline
+        self.interval = interval
+        self.nodes = 0
+
+    def expired(self):
+        """Count one node; True once the deadline has passed."""
+        self.nodes += 1
+        return (self.deadline is not None and self.nodes % self.interval == 0
+                and time.perf_counter() > self.deadline)
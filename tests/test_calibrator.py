@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from board_calibrator import BoardCalibrator
+from cell_classifier import EMPTY_TILE_COLOR, UNCLICKED_COLOR, WHITELISTED_COLORS
+from tile_recognizer import ASSETS_DIR
+
+BACKGROUND = (30, 38, 46)
+BORDER = (112, 120, 128)
+
+
+def draw_board(rows, cols, cell_size, origin, border=0, seed=0, shape=(700, 1200)):
+    """Screen with a board of unclicked, empty and numbered cells, each inside a border of the given width."""
+    rng = np.random.default_rng(seed)
+    screen = np.full(shape + (3,), BACKGROUND, dtype=np.uint8)
+    left, top = origin
+    inner = cell_size - 2 * border
+    for row in range(rows):
+        for col in range(cols):
+            y, x = top + row * cell_size, left + col * cell_size
+            screen[y:y + cell_size, x:x + cell_size] = BORDER
+            value = rng.integers(-1, 4)
+            tile = screen[y + border:y + border + inner, x + border:x + border + inner]
+            tile[:] = UNCLICKED_COLOR if value < 0 else EMPTY_TILE_COLOR
+            if value > 0:
+                tile[inner // 3:2 * inner // 3, inner // 3:2 * inner // 3] = WHITELISTED_COLORS[value - 1]
+    return screen
+
+
+def test_borderless_tiles():
+    calibration = BoardCalibrator().calibrate(draw_board(16, 30, 20, (40, 30)))
+    assert calibration == {'top_left': (40, 30), 'bottom_right': (40 + 29 * 20, 30 + 15 * 20),
+                           'cell_size': 20, 'rows': 16, 'columns': 30}
+
+
+def test_tiles_with_borders():
+    calibration = BoardCalibrator().calibrate(draw_board(9, 9, 30, (100, 50), border=2))
+    assert (calibration['cell_size'], calibration['rows'], calibration['columns']) == (30, 9, 9)
+    assert calibration['top_left'] == (100, 50)
+
+
+def test_asset_tile_geometry():
+    """The shipped tile leaves 15px between the interiors of neighbouring tiles."""
+    tile = np.asarray(Image.open(os.path.join(ASSETS_DIR, 'unclicked_tile.png')).convert('RGB'))
+    screen = np.full((700, 900, 3), BACKGROUND, dtype=np.uint8)
+    origin = (60, 45)
+    for row in range(9):
+        for col in range(12):
+            y, x = origin[1] + row * 52, origin[0] + col * 52
+            screen[y:y + 52, x:x + 52] = tile
+    interior = tuple(int(v) for v in tile[26, 26])
+    calibration = BoardCalibrator(tile_colors=(interior,)).calibrate(screen)
+    assert (calibration['cell_size'], calibration['rows'], calibration['columns']) == (52, 9, 12)
+    left, top = calibration['top_left']
+    assert abs(left - origin[0]) <= 1 and abs(top - origin[1]) <= 1
+
+
+def test_rejects_boards_that_do_not_fit():
+    calibrator = BoardCalibrator()
+    assert calibrator.calibrate(draw_board(3, 3, 30, (100, 50), border=2)) is None
+    # A board cut off mid-cell by the edge of the screen
+    assert calibrator.calibrate(draw_board(9, 9, 30, (100, 50), border=2, shape=(700, 355))) is None
+    assert calibrator.calibrate(np.full((300, 400, 3), BACKGROUND, dtype=np.uint8)) is None
@@ -0,0 +1,67 @@
+import numpy as np
+
+from board_processor import BoardProcessor
+from cell_classifier import EMPTY_TILE_COLOR, UNCLICKED_COLOR, WHITELISTED_COLORS
+from minesweeper_simulator import MinesweeperGame, SimulatedBot
+from screen_capture import ArrayCapture
+
+CELL_SIZE = 20
+ORIGIN = (30, 40)
+
+
+def render(grid, screen):
+    """Draw a simulator grid the way the classifier expects the game to look."""
+    left, top = ORIGIN
+    for row, values in enumerate(grid):
+        for col, value in enumerate(values):
+            y, x = top + row * CELL_SIZE, left + col * CELL_SIZE
+            if value is None or value == -1:
+                screen[y:y + CELL_SIZE, x:x + CELL_SIZE] = UNCLICKED_COLOR
+            else:
+                screen[y:y + CELL_SIZE, x:x + CELL_SIZE] = EMPTY_TILE_COLOR
+                if value:
+                    screen[y + 6:y + 14, x + 6:x + 14] = WHITELISTED_COLORS[value - 1]
+
+
+def processor(capture, rows, cols, incremental):
+    board_processor = BoardProcessor(CELL_SIZE, incremental=incremental, capture=capture)
+    board_processor.corners = [ORIGIN, ORIGIN]
+    board_processor.rows, board_processor.columns = rows, cols
+    board_processor.game_grid = [[None] * cols for _ in range(rows)]
+    board_processor.reset_refresh_state()
+    return board_processor
+
+
+def test_grab_regions_of_the_same_size_do_not_share_buffers():
+    screen = np.random.default_rng(0).integers(0, 256, (50, 50, 3), dtype=np.uint8)
+    first, second = ArrayCapture(screen).grab_regions([(0, 0, 10, 10), (5, 5, 15, 15)])
+    assert first is not second
+    assert np.array_equal(first, screen[0:10, 0:10])
+    assert np.array_equal(second, screen[5:15, 5:15])
+
+
+def test_incremental_refresh_matches_full_rescan():
+    rows, cols = 16, 30
+    for seed in range(2):
+        game = MinesweeperGame(rows, cols, 99, seed=seed)
+        bot = SimulatedBot(game)
+        screen = np.full((400, 700, 3), 20, dtype=np.uint8)
+        incremental = processor(ArrayCapture(screen), rows, cols, incremental=True)
+        full = processor(ArrayCapture(screen), rows, cols, incremental=False)
+
+        while not game.finished:
+            before = [row[:] for row in game.grid]
+            bot.step()
+            for row in range(rows):
+                for col in range(cols):
+                    if before[row][col] != game.grid[row][col] and game.grid[row][col] != -1:
+                        incremental.mark_dirty(row, col)
+            render(game.grid, screen)
+            incremental.capture.set_screen(screen)
+            full.capture.set_screen(screen)
+            flags = [(row, col) for row in range(rows) for col in range(cols) if game.grid[row][col] == -1]
+            incremental.flag_positions = list(flags)
+            full.flag_positions = list(flags)
+
+            assert incremental.update_game_board() == full.update_game_board()
+            assert incremental.game_grid == full.game_grid
@@ -0,0 +1,191 @@
+"""
+Solver checks against seeded simulator games. They need no display:
+
+    python -m pytest -q tests
+"""
+import random
+import time
+from itertools import combinations
+
+import pytest
+
+from board_model import BoardModel
+from minesweeper_analyzer import MinesweeperAnalyzer
+from minesweeper_simulator import MinesweeperGame, SimulatedBot
+from probability_solver import ProbabilitySolver
+
+
+def stage_deductions(analyzer):
+    """(safe cells, mine cells) of every deduction stage, keyed by stage name."""
+    basic_safe, basic_mines, _ = analyzer.find_basic_deductions()
+    return {
+        'local': analyzer.find_local_moves(),
+        'pattern': analyzer.pattern_analyzer.analyze_patterns(),
+        'basic': (basic_safe, basic_mines),
+        'reduce': analyzer.find_reduced_moves(),
+        'endgame': analyzer.find_endgame_moves(),
+    }
+
+
+def played_boards(rows, cols, mines, seed):
+    """Yield (game, bot) before every move of a seeded simulator game, once the mines are placed."""
+    game = MinesweeperGame(rows, cols, mines, seed=seed)
+    # No wall-clock budget, so every run plays the same game
+    bot = SimulatedBot(game, time_budget=None)
+    for _ in range(bot.max_moves):
+        if game.finished:
+            return
+        if game.mine_positions is not None:
+            bot.analyzer.update(game.grid)
+            yield game, bot
+        bot.step()
+
+
+@pytest.mark.parametrize('rows, cols, mines, games', [(9, 9, 10, 30), (16, 16, 40, 20), (16, 30, 99, 10)])
+def test_deductions_are_sound(rows, cols, mines, games):
+    checked = 0
+    for seed in range(games):
+        for game, bot in played_boards(rows, cols, mines, seed):
+            for stage, (safe, found_mines) in stage_deductions(bot.analyzer).items():
+                assert not set(safe) & game.mine_positions, (stage, seed)
+                assert set(found_mines) <= game.mine_positions, (stage, seed)
+            checked += 1
+    assert checked > games
+
+
+def brute_force_probabilities(grid, rows, cols, total_mines):
+    """Mine probability of every unknown cell, by trying every placement of the remaining mines."""
+    unknown = [(x, y) for x in range(rows) for y in range(cols) if grid[x][y] is None]
+    flags = sum(1 for row in grid for value in row if value == -1)
+    index = {cell: i for i, cell in enumerate(unknown)}
+
+    constraints = []
+    for x in range(rows):
+        for y in range(cols):
+            value = grid[x][y]
+            if value is None or value < 0:
+                continue
+            mask = 0
+            for adj_x in range(max(x - 1, 0), min(x + 2, rows)):
+                for adj_y in range(max(y - 1, 0), min(y + 2, cols)):
+                    if grid[adj_x][adj_y] is None:
+                        mask |= 1 << index[(adj_x, adj_y)]
+                    elif grid[adj_x][adj_y] == -1:
+                        value -= 1
+            constraints.append((mask, value))
+
+    total = 0
+    counts = [0] * len(unknown)
+    for placement in combinations(range(len(unknown)), total_mines - flags):
+        mask = sum(1 << i for i in placement)
+        if all(bin(mask & cells).count('1') == value for cells, value in constraints):
+            total += 1
+            for i in placement:
+                counts[i] += 1
+    return {cell: counts[i] / total for cell, i in index.items()}
+
+
+def small_boards(max_unknown=18):
+    """Boards from seeded 6x6 games that are small enough to brute force."""
+    for seed in range(40):
+        for game, bot in played_boards(6, 6, 6, seed):
+            unknown = sum(1 for row in game.grid for value in row if value is None)
+            if 0 < unknown <= max_unknown:
+                yield seed, game
+
+
+def test_probabilities_match_brute_force():
+    checked = 0
+    for seed, game in small_boards():
+        grid = [row[:] for row in game.grid]
+        expected = brute_force_probabilities(grid, game.rows, game.cols, game.mines)
+
+        analyzer = MinesweeperAnalyzer(grid, game.rows, game.cols, total_mines=game.mines, time_budget=None)
+        solved = ProbabilitySolver(total_mines=game.mines).solve(analyzer.model)
+        for probabilities in (solved, analyzer.get_mine_probabilities()):
+            assert probabilities.keys() == expected.keys(), seed
+            for cell, probability in expected.items():
+                assert probabilities[cell] == pytest.approx(probability), (seed, cell)
+        checked += 1
+    assert checked > 50
+
+
+def test_lookahead_weights_are_consistent():
+    """The outcome weights of a safe guess add up to the weight of the configurations where it is safe."""
+    checked = 0
+    for seed, game in small_boards():
+        grid = [row[:] for row in game.grid]
+        analyzer = MinesweeperAnalyzer(grid, game.rows, game.cols, total_mines=game.mines, time_budget=None)
+        probabilities = analyzer.get_mine_probabilities()
+        if not probabilities:
+            continue
+        solver = analyzer.probability_solver
+        selector = analyzer.guess_selector
+        constraints, unknown, flags = analyzer.model.constraints()
+        mines_left = solver.estimate_mines_left(game.rows, game.cols, flags)
+        _, total = solver.solve_constraints(constraints, unknown, mines_left)
+        cell = selector.candidates(probabilities)[0]
+        outcomes = selector.outcomes(cell, constraints, unknown, mines_left, probabilities, None)
+        safe_weight = sum(weight for _, weight, _ in outcomes)
+        assert safe_weight / total == pytest.approx(1 - probabilities[cell]), seed
+        checked += 1
+    assert checked > 50
+
+
+def chain_board(cols, density=0.3, seed=2):
+    """
+    A 3-row board with every other cell of the middle row revealed, so the
+    whole frontier is one long chain of overlapping constraints. Returns
+    (grid, mine cells).
+    """
+    rng = random.Random(seed)
+    revealed = {(1, y) for y in range(0, cols, 2)}
+    mines = {(x, y) for x in range(3) for y in range(cols) if (x, y) not in revealed and rng.random() < density}
+    grid = [[None] * cols for _ in range(3)]
+    for x, y in revealed:
+        grid[x][y] = sum((x + dx, y + dy) in mines for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+    return grid, mines
+
+
+def test_sampled_counts_are_in_configurations():
+    """Sampled component counts estimate the exact counts, so the two can be combined."""
+    for cols in (5, 7, 9):
+        for seed in range(3):
+            grid, mines = chain_board(cols, seed=seed)
+            model = BoardModel(3, cols)
+            model.load(grid)
+            constraints, unknown, _ = model.constraints()
+            # A fixed number of samples, so the estimates do not depend on the machine's speed
+            solver = ProbabilitySolver(total_mines=len(mines), min_samples=2000, sample_tolerance=0, seed=seed)
+            components = solver.split_components(constraints)
+            exact = [solver.solve_component(component) for component in components]
+            sampled = [solver.sample_component(component, time.perf_counter()) for component in components]
+            interior = len(unknown) - sum(len(solution.cells) for solution in exact)
+            exact_probabilities, exact_total = solver.combine(exact, interior, len(mines))
+            sampled_probabilities, sampled_total = solver.combine(sampled, interior, len(mines))
+            assert float(sampled_total / exact_total) == pytest.approx(1, rel=0.05), (cols, seed)
+            for cell, probability in exact_probabilities.items():
+                assert sampled_probabilities[cell] == pytest.approx(probability, abs=0.05), (cols, seed, cell)
+
+
+def test_long_chains_are_sampled():
+    """A component far over the exact limit is sampled, without running out of stack or valid samples."""
+    cols = 401
+    grid, mines = chain_board(cols)
+    analyzer = MinesweeperAnalyzer(grid, 3, cols, time_budget=0.5)
+    probabilities = analyzer.get_mine_probabilities()
+    assert probabilities.keys() == {(x, y) for x in range(3) for y in range(cols) if grid[x][y] is None}
+    on_mines = [probability for cell, probability in probabilities.items() if cell in mines]
+    on_safe = [probability for cell, probability in probabilities.items() if cell not in mines]
+    assert sum(on_mines) / len(on_mines) > sum(on_safe) / len(on_safe) + 0.1
+
+
+def test_chords_are_clicked():
+    """Safe cells next to a satisfied number are opened with a chord, whichever stage proved them."""
+    chords = 0
+    moves = 0
+    for seed in range(3):
+        result = SimulatedBot(MinesweeperGame(16, 16, 40, seed=seed), time_budget=None).play()
+        chords += result['chords']
+        moves += result['moves']
+    assert chords > moves // 10
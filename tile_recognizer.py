@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from cell_classifier import BOMB_COLOR, UNREVEALED, CellClassifier
+
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+# Reference tile file -> label. Flags are tracked by the bot, so a flag tile reads as unrevealed.
+TILE_LABELS = {
+    'unclicked_tile.png': UNREVEALED,
+    'flag_tile.png': UNREVEALED,
+    'clicked_empty_tile.png': 0,
+    **{f'number_{n}.png': n for n in range(1, 9)},
+    'mine.png': None,  # a bomb
+}
+
+
+def sample_offsets(length, points):
+    """Pixel offsets of `points` evenly spaced sample points along a cell of `length` pixels."""
+    return ((np.arange(points) + 0.5) * length / points).astype(np.intp)
+
+
+class TileRecognizer:
+    """
+    Classifies cells by nearest-neighbour matching against the reference tiles in assets/.
+
+    Every cell is read at a fixed grid of sample points, samples x samples of
+    them for each of the feature_size x feature_size blocks, and the blocks
+    are averaged into a small feature vector. The reference tiles are loaded
+    once and reduced the same way, so cell sizes other than the 52px of the
+    reference tiles work too. The samples of the whole board come out of the
+    frame in one gather, which also serves the bomb check, and all cells are
+    matched in one batched distance computation. The confidence of every match
+    is kept in `confidence` (1 when the best tile is far closer than the
+    runner-up, 0 when two tiles are equally close).
+    """
+
+    def __init__(self, assets_dir=ASSETS_DIR, feature_size=8, samples=3):
+        self.feature_size = feature_size
+        self.samples = samples
+        self.confidence = None
+
+        features = []
+        labels = []
+        for name, label in TILE_LABELS.items():
+            path = os.path.join(assets_dir, name)
+            if not os.path.exists(path):
+                continue
+            tile = np.asarray(Image.open(path).convert('RGB'))
+            points = feature_size * samples
+            pixels = tile[sample_offsets(tile.shape[0], points)[:, None], sample_offsets(tile.shape[1], points)]
+            feature, _ = self.reduce(pixels.reshape(1, points, 1, points, 3))
+            feature = feature.ravel()
+            # Skip tiles that duplicate an earlier one, they would make every match ambiguous
+            if any(np.array_equal(feature, other) for other in features):
+                print(f"Skipping {name}: identical to another reference tile")
+                continue
+            features.append(feature)
+            labels.append(label)
+
+        self.bank = np.array(features, dtype=np.float32)
+        self.bank_norms = (self.bank ** 2).sum(axis=1)
+        self.is_bomb = np.array([label is None for label in labels])
+        self.labels = np.array([UNREVEALED if label is None else label for label in labels], dtype=np.int8)
+
+    def reduce(self, pixels):
+        """
+        Reduce the (a, n, b, n, channels) sample points of an a x b block of
+        cells to (features (a, b, size, size, 3), bombs (a, b)).
+
+        A cell has a bomb if one of the samples in its middle blocks has the
+        bomb colour (pure black), the area the colour classifier looks at.
+        """
+        size = self.feature_size
+        samples = self.samples
+        a, _, b, _, channels = pixels.shape
+        # Summing the samples slice by slice is much faster than a NumPy reduction over a short middle axis
+        blocks = pixels.reshape(a * size, samples, b * size, samples, channels)
+        rows = blocks[:, 0].astype(np.uint16)
+        for i in range(1, samples):
+            rows += blocks[:, i]
+        sums = rows[:, :, 0].copy()
+        for i in range(1, samples):
+            sums += rows[:, :, i]
+        features = sums[..., :3].reshape(a, size, b, size, 3).transpose(0, 2, 1, 3, 4) / np.float32(samples ** 2)
+
+        middle = slice((size // 2 - 1) * samples, (size // 2 + 1) * samples)
+        black = pixels[:, middle, :, middle, :3].max(axis=-1) == max(BOMB_COLOR)
+        return features, black.any(axis=(1, 3))
+
+    def sample_board(self, frame, rows, cols, cell_size):
+        """Return the (rows, n, cols, n, channels) sample points of every cell of the board."""
+        points = self.feature_size * self.samples
+        offsets = sample_offsets(cell_size, points)
+        ys = (np.arange(rows)[:, None] * cell_size + offsets).ravel()
+        xs = (np.arange(cols)[:, None] * cell_size + offsets).ravel()
+        # Two single-axis takes copy far less than one fancy index over both axes
+        pixels = np.take(np.take(frame, ys, axis=0), xs, axis=1)
+        return pixels.reshape(rows, points, cols, points, frame.shape[2])
+
+    def sample_cells(self, frame, cells, cell_size):
+        """Return the (n, points, 1, points, channels) sample points of the given (row, col) cells."""
+        cells = np.asarray(cells, dtype=np.intp).reshape(-1, 2)
+        points = self.feature_size * self.samples
+        offsets = sample_offsets(cell_size, points)
+        ys = cells[:, 0, None] * cell_size + offsets
+        xs = cells[:, 1, None] * cell_size + offsets
+        return frame[ys[:, :, None], xs[:, None, :]].reshape(len(cells), points, 1, points, frame.shape[2])
+
+    def label_features(self, features, bombs):
+        """
+        Match (..., size, size, 3) downscaled cells against the feature bank.
+
+        Returns (labels, bombs) with the same meaning as CellClassifier.label_patches.
+        """
+        shape = features.shape[:-3]
+        features = features.reshape(-1, self.bank.shape[1])
+
+        distances = (features ** 2).sum(axis=1)[:, None] - 2 * features @ self.bank.T + self.bank_norms
+        distances = np.sqrt(np.maximum(distances, 0))
+        nearest = np.argsort(distances, axis=1)[:, :2]
+        best = np.take_along_axis(distances, nearest, axis=1)
+        if best.shape[1] > 1:
+            confidence = 1 - best[:, 0] / np.maximum(best[:, 1], 1e-6)
+        else:
+            confidence = np.ones(len(best))
+        self.confidence = confidence.reshape(shape)
+
+        match = nearest[:, 0]
+        return self.labels[match].reshape(shape), self.is_bomb[match].reshape(shape) | bombs
+
+    def classify(self, frame, rows, cols, cell_size):
+        """Classify the whole board. Returns (labels, bomb_found)."""
+        labels, bombs = self.label_features(*self.reduce(self.sample_board(frame, rows, cols, cell_size)))
+        return labels, bool(bombs.any())
+
+    def classify_cells(self, frame, cells, cell_size):
+        """Classify only the given (row, col) cells. Returns (labels, bomb_found)."""
+        features, bombs = self.reduce(self.sample_cells(frame, cells, cell_size))
+        labels, bombs = self.label_features(features[:, 0], bombs[:, 0])
+        return labels, bool(bombs.any())
+
+
+def create_classifier(name='color'):
+    """Cell classifier by name: 'color' for the colour classifier, 'tiles' to match the tiles in assets/."""
+    if name == 'tiles':
+        return TileRecognizer()
+    if name == 'color':
+        return CellClassifier()
+    raise ValueError(f"Unknown cell classifier: {name}")